@@ -1,7 +1,21 @@
 from mmn_experiments.decorator import experiment as decorator_experiment
-from mmn_experiments.keras import telegramCallback
 from mmn_experiments.data import dades
 from mmn_experiments.experiment import experiment
 
 __version__ = "1.6.3"
 
+_LAZY_MODULES = {"keras": "mmn_experiments.keras",
+                 "telegramCallback": "mmn_experiments.keras.telegramCallback"}
+
+
+def __getattr__(name):
+    """ Loads on first access the submodules that depend on heavy backends (TensorFlow). """
+    if name in _LAZY_MODULES:
+        import importlib
+
+        module = importlib.import_module(_LAZY_MODULES[name])
+        globals()[name] = module
+
+        return module
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,4 +3,5 @@
 """
 
 from . import dades
+from .dades import Data, DataBatch
 
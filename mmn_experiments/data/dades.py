@@ -1,12 +1,107 @@
 # -*- coding: utf-8 -*-
 """ Auxiliary classes to handle data for experiments.
+
+Besides the storage types of StorageType, custom types can be registered with
+register_storage_type, with the functions used to save and load them.
 """
+from enum import Enum
+from typing import Callable, Dict, List, NamedTuple, Optional
+import copy
 
 import numpy as np
 
-STORAGES_TYPES = ["color_image", "coordinates_image", "string", "object", "coordinates",
-                  "coordinates_values", "squares", "ellipses", "binary_image", "column",
-                  "coordinates_values_image"]
+
+class StorageType(str, Enum):
+    """ Storage types of the data. The members are equal to their value. """
+    COLOR_IMAGE = "color_image"
+    COORDINATES_IMAGE = "coordinates_image"
+    STRING = "string"
+    OBJECT = "object"
+    COORDINATES = "coordinates"
+    COORDINATES_VALUES = "coordinates_values"
+    SQUARES = "squares"
+    ELLIPSES = "ellipses"
+    BINARY_IMAGE = "binary_image"
+    COLUMN = "column"
+    COORDINATES_VALUES_IMAGE = "coordinates_values_image"
+
+    def __str__(self):
+        return self.value
+
+
+STORAGES_TYPES = [storage_type.value for storage_type in StorageType]
+
+_TYPES_BY_VALUE = {storage_type.value: storage_type for storage_type in StorageType}
+
+# Type of a 2D numpy array depending on the number of columns, the other ones are binary images
+_COLUMNS_TYPES = {2: StorageType.COORDINATES, 3: StorageType.COORDINATES_VALUES,
+                  4: StorageType.SQUARES, 5: StorageType.ELLIPSES}
+
+_IMAGE_TYPES = (StorageType.COLOR_IMAGE, StorageType.BINARY_IMAGE)
+
+
+class StoragePlugin(NamedTuple):
+    """ Functions to save and load a custom storage type.
+
+    Attributes:
+        extension (str): Extension of the files, with the dot.
+        save (Callable): save(value, handle), writes the value on a binary file.
+        load (Callable): load(handle), reads the value from a binary file. Optional.
+    """
+    extension: str
+    save: Callable
+    load: Optional[Callable] = None
+
+
+CUSTOM_TYPES: Dict[str, StoragePlugin] = {}
+
+
+def register_storage_type(name: str, extension: str, save: Callable,
+                          load: Callable = None) -> None:
+    """ Registers a custom storage type.
+
+    The data of the type must be created with tipus=name. The experiments save them with the save
+    function, on a file with the extension, and the results reader loads these files with the load
+    function.
+
+    Args:
+        name (str): Name of the storage type.
+        extension (str): Extension of the files, for example ".parquet".
+        save (Callable): save(value, handle), writes the value on a binary file.
+        load (Callable): load(handle), reads the value from a binary file.
+
+    Raises:
+        ValueError if the name is one of the built-in storage types.
+    """
+    if name in _TYPES_BY_VALUE:
+        raise ValueError(f"Storage type {name} already exists.")
+    if not extension.startswith("."):
+        extension = "." + extension
+
+    CUSTOM_TYPES[name] = StoragePlugin(extension.lower(), save, load)
+
+
+def _check_type(tipus: str) -> str:
+    """ Gets the storage type with the name, the member of StorageType for the built-in ones.
+
+    Raises:
+        ValueError if the storage type is not known.
+    """
+    if tipus in _TYPES_BY_VALUE:
+        return _TYPES_BY_VALUE[tipus]
+    if tipus not in CUSTOM_TYPES:
+        raise ValueError(f"Unknown storage type {tipus}.")
+
+    return tipus
+
+
+def plugin_for_extension(extension: str) -> Optional[StoragePlugin]:
+    """ Gets the custom storage type saved with an extension, None if there is not any. """
+    for plugin in CUSTOM_TYPES.values():
+        if plugin.extension == extension:
+            return plugin
+
+    return None
 
 
 class Data:
@@ -14,15 +109,24 @@ class Data:
 
 
     """
+    __slots__ = ("_data", "_storage_type", "_path", "_name", "_colormap", "_image_format",
+                 "_image_options")
 
-    def __init__(self, data, path: str, name: str = None, tipus=None):
+    def __init__(self, data, path: str, name: str = None, tipus=None, colormap: str = None,
+                 image_format: str = None, image_options: dict = None):
         """
 
         Args:
             data :
             path (str):
             name (str):
-            tipus (str):
+            tipus (str): Storage type, see StorageType and register_storage_type. If None it is
+                         discovered from the data.
+            colormap (str): Name of the matplotlib colormap used to save the coordinates values
+                            images. If None the default colormap of the experiment is used.
+            image_format (str): Format used to save the images, see experiment.IMAGE_FORMATS. If
+                                None the format of the experiment is used.
+            image_options (dict): Options of the image format, see the cv2.IMWRITE_* flags.
         Raises:
             ValueError if the storage type is not known.
         """
@@ -30,56 +134,65 @@ class Data:
             data = data[0]
         self._data = data
 
-        if tipus is None:
-            tipus = self._discover_type()
-
-        self._storage_type = tipus
+        self._storage_type = self._discover_type() if tipus is None else _check_type(tipus)
         self._path = path
         self._name = name
+        self._colormap = colormap
+        self._image_format = image_format
+        self._image_options = image_options
 
-    def _discover_type(self) -> str:
+    def _discover_type(self) -> StorageType:
         """ Discover the type of the data.
 
-        Discovers the data type. The values can only be the ones saved on the _STORAGE_TYPES array.
+        Discovers the data type. The values can only be the ones of StorageType.
 
         Returns:
-            String with the type of the values.
+            Storage type of the values.
         """
+        data = self._data
         storage_type = None
-        if isinstance(self.data, str):
-            storage_type = STORAGES_TYPES[2]
-        elif isinstance(self.data, np.ndarray):
-            storage_type = self._discover_numpy(self.data)
-        elif isinstance(self.data, tuple):
-            if len(self.data) == 2:
-                first, second = self.data
-                first_type = self._discover_numpy(first)
-                second_type = self._discover_numpy(second)
-                if self.is_image(first_type) and second_type == STORAGES_TYPES[4]:
-                    storage_type = STORAGES_TYPES[1]
-            elif len(self.data) == 3:
-                first, second, third = self.data
-                first_type = self._discover_numpy(first)
-                second_type = self._discover_numpy(second)
-                third_type = self._discover_numpy(third)
-
-                if self.is_image(first_type) and second_type == STORAGES_TYPES[4] \
-                        and third_type == STORAGES_TYPES[9]:
-                    storage_type = STORAGES_TYPES[10]
-        elif isinstance(self.data, object):
-            storage_type = STORAGES_TYPES[3]
+        if isinstance(data, np.ndarray):
+            storage_type = self._discover_numpy(data)
+        elif isinstance(data, str):
+            storage_type = StorageType.STRING
+        elif isinstance(data, tuple):
+            if len(data) == 2:
+                if self.is_image(self._discover_numpy(data[0])) and \
+                        self._discover_numpy(data[1]) is StorageType.COORDINATES:
+                    storage_type = StorageType.COORDINATES_IMAGE
+            elif len(data) == 3:
+                if self.is_image(self._discover_numpy(data[0])) and \
+                        self._discover_numpy(data[1]) is StorageType.COORDINATES and \
+                        self._discover_numpy(data[2]) is StorageType.COLUMN:
+                    storage_type = StorageType.COORDINATES_VALUES_IMAGE
+        else:
+            storage_type = StorageType.OBJECT
 
         if storage_type is None:
             raise ValueError("Unknown data type.")
 
         return storage_type
 
+    def renamed(self, name: str) -> 'Data':
+        """ Copy of the data with another name. The content is not copied.
+
+        Args:
+            name (str): Name of the copy.
+
+        Returns:
+            Data object.
+        """
+        other = copy.copy(self)
+        other._name = name
+
+        return other
+
     @staticmethod
     def is_image(tipus: str) -> bool:
-        return tipus in (STORAGES_TYPES[0], STORAGES_TYPES[8])
+        return tipus in _IMAGE_TYPES
 
     @staticmethod
-    def _discover_numpy(data: np.ndarray) -> str:
+    def _discover_numpy(data: np.ndarray) -> StorageType:
         """ Discovers witch type of numpy data is.
 
         Depending on the shape and the length of the axis is possible to get the type. There are six
@@ -99,22 +212,14 @@ class Data:
 
         """
         storage_type = None
+        shape = data.shape
 
-        if len(data.shape) == 2:
-            if data.shape[1] == 2:
-                storage_type = STORAGES_TYPES[4]
-            elif data.shape[1] == 3:
-                storage_type = STORAGES_TYPES[5]
-            elif data.shape[1] == 4:
-                storage_type = STORAGES_TYPES[6]
-            elif data.shape[1] == 5:
-                storage_type = STORAGES_TYPES[7]
-            else:
-                storage_type = STORAGES_TYPES[8]
-        elif len(data.shape) == 3:
-            storage_type = STORAGES_TYPES[0]
-        elif len(data.shape) == 1:
-            storage_type = STORAGES_TYPES[9]
+        if len(shape) == 2:
+            storage_type = _COLUMNS_TYPES.get(shape[1], StorageType.BINARY_IMAGE)
+        elif len(shape) == 3:
+            storage_type = StorageType.COLOR_IMAGE
+        elif len(shape) == 1:
+            storage_type = StorageType.COLUMN
 
         if storage_type is None:
             raise ValueError("Unknown numpy format.")
@@ -158,3 +263,130 @@ class Data:
         """
 
         return self._name
+
+    @property
+    def colormap(self):
+        """
+
+        Returns:
+
+        """
+
+        return self._colormap
+
+    @property
+    def image_format(self):
+        """
+
+        Returns:
+
+        """
+
+        return self._image_format
+
+    @property
+    def image_options(self):
+        """
+
+        Returns:
+
+        """
+
+        return self._image_options
+
+
+class DataBatch:
+    """ Batch of homogeneous data saved on the same path.
+
+    The items are the elements of a stacked numpy array (for example N x H x W x C images) or, if
+    offsets are set, the slices of a ragged array (for example the coordinates of N predictions
+    concatenated). The type is discovered once, from the first item, and the experiment saves all
+    the items at once.
+
+    Example:
+        DataBatch(images, "predictions", names="pred_{}")
+        DataBatch(np.concatenate(coordinates), "points", offsets=[0, 10, 25, 31])
+    """
+    __slots__ = ("_data", "_offsets", "_path", "_names", "_storage_type", "_colormap",
+                 "_image_format", "_image_options")
+
+    def __init__(self, data: np.ndarray, path: str, names=None, offsets=None, tipus=None,
+                 colormap: str = None, image_format: str = None, image_options: dict = None):
+        """
+
+        Args:
+            data (np.ndarray): Stacked array, the first axis are the items, or ragged array.
+            path (str): Path where all the items are saved.
+            names (str | List[str]): Pattern of the names, formatted with the position of the item
+                                     (for example "pred_{}"), or list with the names. If None the
+                                     names are set as for the data without name.
+            offsets (List[int]): Start of every item on a ragged array and, as last value, the end
+                                 of the last item. If None the data is a stacked array.
+            tipus (str): Storage type of the items. If None it is discovered from the first item.
+            colormap (str): See Data.
+            image_format (str): See Data.
+            image_options (dict): See Data.
+        Raises:
+            ValueError if the storage type is not known or the names do not match the items.
+        """
+        self._data = data
+        self._offsets = np.asarray(offsets) if offsets is not None else None
+        self._path = path
+        self._colormap = colormap
+        self._image_format = image_format
+        self._image_options = image_options
+
+        if isinstance(names, str):
+            names = [names.format(i) for i in range(len(self))]
+        if names is not None and len(names) != len(self):
+            raise ValueError(f"{len(names)} names for {len(self)} items.")
+        self._names = names
+
+        if tipus is None:
+            tipus = Data._discover_numpy(self[0]) if len(self) > 0 else StorageType.OBJECT
+        self._storage_type = _check_type(tipus)
+
+    def __len__(self):
+        if self._offsets is not None:
+            return len(self._offsets) - 1
+
+        return len(self._data)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if self._offsets is not None:
+            return self._data[self._offsets[index]:self._offsets[index + 1]]
+
+        return self._data[index]
+
+    def unbatch(self, names: List[str]) -> List[Data]:
+        """ Data of every item. The content is not copied.
+
+        Args:
+            names (List[str]): Name of every item.
+
+        Returns:
+            List of data.
+        """
+        return [Data(self[i], self._path, name=name, tipus=self._storage_type,
+                     colormap=self._colormap, image_format=self._image_format,
+                     image_options=self._image_options) for i, name in enumerate(names)]
+
+    @property
+    def data(self):
+        return self._data
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def storage_type(self):
+        return self._storage_type
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def names(self):
+        return self._names
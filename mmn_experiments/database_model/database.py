@@ -5,46 +5,186 @@ This module wrapper an ORM (peewee) to connect the experiments with a relational
 
 Written by: Miquel Miró Nicolau (UIB)
 """
-from typing import Dict
+from typing import Dict, List, Union
+import contextlib
 import datetime
 import os
+import threading
 
 from peewee import *
 
 from mmn_experiments.experiment import experiment as exp
 
-DB = SqliteDatabase(None)
+# Database of the models used outside an ExperimentDB, for example the db_object of an experiment.
+# It is the first database started by the process.
+DB = DatabaseProxy()
+
+# Pragmas applied on every connection to the database. The "wal" profile allows readers and a
+# writer to work at the same time, needed when multiple experiments share the database. The WAL mode
+# does not work on network file systems (NFS).
+PRAGMA_PROFILES = {
+    'default': {},
+    'wal': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'cache_size': -64 * 1024,  # KiB
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 60 * 1000,  # ms
+    },
+}
 
 
 class ExperimentDB:
+    """ Handler of an experiments database.
 
-    @staticmethod
-    def start(path: str):
+    Every database file has a single connection handler on the process, shared by all the handlers
+    of the same path, so multiple experiments of the same process can use the same database, and
+    experiments of different databases can be used at the same time. Every thread has its own
+    connection, opened on the first access to the database. After a fork the connections inherited
+    from the parent process are discarded and the child opens its own ones.
+
+    The models are bound to the database of the handler during every operation, the operations of
+    the process are serialized.
+    """
+    BATCH_SIZE = 100  # Rows by statement, keeps the statements below the SQLite variables limit
+
+    _lock = threading.RLock()
+    _databases: Dict[str, SqliteDatabase] = {}  # Connection handler of every path
+    _pragmas: Dict[str, Dict] = {}  # Pragmas of every path
+    _ready = set()  # Databases with the tables created by this process
+
+    def __init__(self):
+        self.__db = None
+
+    def start(self, path: str, pragmas: Union[str, Dict] = 'default'):
         """
-        Initialize the database in the case that do not exist, otherwise it connects the method the
-        library to the peewee handler
+        Initialize the database handler. The connection is opened, and the tables are created when
+        needed, on the first access to the database. All the handlers of the same path share the
+        pragmas of the first one started.
 
         Args:
             path: String with the path to the database.
+            pragmas: Name of a profile of PRAGMA_PROFILES or dictionary with the SQLite pragmas.
 
+        Raises:
+            ValueError if the profile of pragmas is not known, or the database is already used with
+            other pragmas.
         """
-        is_created = os.path.isfile(path)
-
-        DB.init(path)
+        if isinstance(pragmas, str):
+            if pragmas not in PRAGMA_PROFILES:
+                raise ValueError(f"Unknown pragmas profile {pragmas}.")
+            pragmas = PRAGMA_PROFILES[pragmas]
+
+        path = os.path.abspath(path)
+        with ExperimentDB._lock:
+            db = ExperimentDB._databases.get(path)
+            if db is None:
+                db = ExperimentDB._databases[path] = SqliteDatabase(path, pragmas=pragmas)
+                ExperimentDB._pragmas[path] = dict(pragmas)
+            elif ExperimentDB._pragmas[path] != pragmas:
+                raise ValueError(f"The database {path} is already used with the pragmas "
+                                 f"{ExperimentDB._pragmas[path]}.")
+
+            if DB.obj is None:
+                DB.initialize(db)
+
+        self.__db = db
+
+    def connect(self):
+        """ Opens the connection of the thread and creates the tables, if not done yet. """
+        if self.__db is None:
+            raise RuntimeError("ERROR: Trying to use a database not started.")
+
+        with ExperimentDB._lock:
+            if self.__db.database not in ExperimentDB._ready:
+                models = ExperimentDB.__models()
+                with self.__db.bind_ctx(models):
+                    self.__migrate_indexes()
+                    self.__db.create_tables(models)
+                ExperimentDB._ready.add(self.__db.database)
+
+        self.__db.connect(reuse_if_open=True)
+
+    def close(self):
+        """ Closes the connection of the thread, if opened. """
+        if self.__db is not None and not self.__db.is_closed():
+            self.__db.close()
+
+    @contextlib.contextmanager
+    def __bound(self):
+        """ Connects to the database and binds the models to it. """
+        with ExperimentDB._lock:
+            self.connect()
+            with self.__db.bind_ctx(ExperimentDB.__models()):
+                yield
 
-        DB.connect()
-        if not is_created:
-            results_experiments = Result.experiments.get_through_model()
-            params_experiments = Param.experiments.get_through_model()
-
-            DB.create_tables([Experiment, Result, Param, results_experiments, params_experiments])
+    @staticmethod
+    def __models() -> list:
+        return [Experiment, Result, Param, Result.experiments.get_through_model(),
+                Param.experiments.get_through_model()]
 
     @staticmethod
-    def add_experiment(experiment: exp, params: Dict = None, results: Dict = None):
+    def _after_fork():
+        """ Discards, without closing them, the connections inherited from the parent process. """
+        ExperimentDB._lock = threading.RLock()
+        for db in ExperimentDB._databases.values():
+            db._state.reset()
+
+    def __migrate_indexes(self):
+        """ Prepares a database created with an older version to add the unique indexes.
+
+        The duplicated rows of Result and Param are removed and their links are moved to the row
+        kept, the rows without theta included. The indexes are created afterwards with the
+        tables. Databases that already have the indexes are not modified. The link tables already
+        have a unique index on both columns.
+        """
+        for model in (Result, Param):
+            through = model.experiments.get_through_model()
+            table = model._meta.table_name
+            through_table = through._meta.table_name
+            own_column = getattr(through, model._meta.name).column_name
+
+            existing = {index.name for index in self.__db.get_indexes(table)}
+            expected = {index._name for index in model._meta.fields_to_index()}
+            if not self.__db.table_exists(table) or expected <= existing:
+                continue
+
+            columns = [field.column_name for field in model._meta.sorted_fields
+                       if field.name != 'id']
+            same_values = " AND ".join(f"kept.{column} IS old.{column}" for column in columns)
+            kept_ids = f"SELECT MIN(id) FROM {table} GROUP BY {', '.join(columns)}"
+            with self.__db.atomic('IMMEDIATE'):
+                # Links that would be duplicated are ignored, and removed with the duplicated rows
+                self.__db.execute_sql(
+                    f"UPDATE OR IGNORE {through_table} SET {own_column} = ("
+                    f"SELECT MIN(kept.id) FROM {table} AS kept, {table} AS old "
+                    f"WHERE old.id = {through_table}.{own_column} AND {same_values})")
+                self.__db.execute_sql(
+                    f"DELETE FROM {through_table} WHERE {own_column} NOT IN ({kept_ids})")
+                self.__db.execute_sql(f"DELETE FROM {table} WHERE id NOT IN ({kept_ids})")
+
+    def start_experiment(self, experiment: exp):
+        """ Adds a started experiment to the database, without parameters nor results.
+
+        The end date is set with add_experiment, when the experiment finishes.
+
+        Args:
+            experiment: Experiment to add to the database.
+        """
+        with self.__bound():
+            experiment.db_object = Experiment.create(start_date=experiment.start_time,
+                                                     end_date=experiment.start_time,
+                                                     random_state=experiment.random_state,
+                                                     folder_path=experiment.path,
+                                                     description=experiment.description)
+
+    def add_experiment(self, experiment: exp, params: Dict = None, results: Dict = None):
         """ Add an experiment to the DataBase.
 
         This method adds an experiment to the database. In addition of the solo experiment can also
-        add to the database the parameters information and the results information.
+        add to the database the parameters information and the results information. If the
+        experiment is already on the database, added with start_experiment, its end date and
+        description are updated.
 
         Args:
             experiment: Experiment to add to the database.
@@ -52,12 +192,19 @@ class ExperimentDB:
             results: (optional) Dictionary with the results information.
 
         """
-        inst_exp = Experiment.create(start_date=experiment.start_time, end_date=experiment.end_time,
-                                     random_state=experiment.random_state,
-                                     folder_path=experiment.path,
-                                     description=experiment.description)
-
-        experiment.db_object = inst_exp
+        with self.__bound():
+            inst_exp = experiment.db_object
+            if inst_exp is None:
+                inst_exp = Experiment.create(start_date=experiment.start_time,
+                                             end_date=experiment.end_time,
+                                             random_state=experiment.random_state,
+                                             folder_path=experiment.path,
+                                             description=experiment.description)
+                experiment.db_object = inst_exp
+            else:
+                inst_exp.end_date = experiment.end_time
+                inst_exp.description = experiment.description
+                inst_exp.save()
 
         if params is None:
             params = {}
@@ -65,13 +212,14 @@ class ExperimentDB:
         if results is None:
             results = {}
 
-        ExperimentDB.add_params(experiment, params)
-        ExperimentDB.add_metrics(experiment, results)
+        self.add_params(experiment, params)
+        self.add_metrics(experiment, results)
 
-    @staticmethod
-    def add_metrics(experiment: exp, results: Dict, theta=None):
+    def add_metrics(self, experiment: exp, results: Dict, theta=None):
         """ Add the results of an experiment to the database.
 
+        All the results are added in a single transaction.
+
         Args:
             experiment: Experiment to add the results.
             results: Dictionary with the results information.
@@ -79,42 +227,95 @@ class ExperimentDB:
                     correct.
 
         """
-        for name, value in results.items():
-            res = Result.get_or_none(name=name, value=value, theta=theta)
+        self.add_metric_records(experiment,
+                                [(name, value, theta) for name, value in results.items()])
 
-            if res is None:
-                res = Result.create(name=name, value=value, theta=theta)
+    def add_metric_records(self, experiment: exp, records: List[tuple]):
+        """ Add a list of results of an experiment to the database.
 
-            query = experiment.db_object.results.select().where(Result.name == name,
-                                                                Result.value == value,
-                                                                Result.theta == theta)
+        All the results are added in a single transaction. Unlike add_metrics the same metric can
+        appear multiple times, with different values or theta.
 
-            if not query.exists():
-                experiment.db_object.results.add(res)
+        Args:
+            experiment: Experiment to add the results.
+            records: List of tuples (name, value, theta). Extra items of the tuples are ignored.
+        """
+        by_theta = {}
+        for name, value, theta, *_ in records:
+            by_theta.setdefault(theta, []).append({'name': name, 'value': value, 'theta': theta})
 
-    @staticmethod
-    def add_params(experiment: exp, params: Dict):
+        with self.__bound(), self.__db.atomic('IMMEDIATE'):
+            for theta, rows in by_theta.items():
+                theta_filter = Result.theta.is_null() if theta is None else Result.theta == theta
+                self.__add_values(experiment, Result, rows, theta_filter)
+
+    def add_params(self, experiment: exp, params: Dict):
         """ Add the parameters of an experiment to the database.
 
+        All the parameters are added in a single transaction.
+
         Args:
             experiment: Experiment to add the parameters.
             params: Dictionary with the parameters information.
         """
-        for name, value in params.items():
-            param = Param.get_or_none(name=name, value=value)
+        rows = [{'name': name, 'value': value} for name, value in params.items()]
 
-            if param is None:
-                param = Param.create(name=name, value=value)
+        self.__add_values(experiment, Param, rows, True)
 
-            query = experiment.db_object.params.select().where(Param.name == name,
-                                                               Param.value == value)
+    def __add_values(self, experiment: exp, model, rows: List[Dict], extra_filter):
+        """ Links a set of (name, value) rows to the experiment.
 
-            if not query.exists():
-                experiment.db_object.params.add(param)
+        The rows already on the database are obtained with a single query, the rest are inserted
+        in bulk. Finally the missing links with the experiment are also inserted in bulk.
 
-    @staticmethod
-    def get_experiment(identifier: int):
-        return Experiment.get(Experiment.exp_id == identifier)
+        Args:
+            experiment: Experiment to link the rows.
+            model: Model of the rows, Result or Param.
+            rows: List of dictionaries with the values of the fields of the model.
+            extra_filter: Condition that all the rows fulfil, besides the name and value.
+        """
+        if len(rows) == 0:
+            return
+
+        def key(row):
+            return model.name.db_value(row['name']), model.value.db_value(row['value'])
+
+        def find():
+            found = {}
+            for batch in chunked([key(row) for row in rows], ExperimentDB.BATCH_SIZE):
+                query = model.select(model.id, model.name, model.value).where(
+                    Tuple(model.name, model.value).in_(batch), extra_filter)
+                for instance in query:
+                    found.setdefault((instance.name, instance.value), instance.id)
+            return found
+
+        through = model.experiments.get_through_model()
+        own_field = getattr(through, model._meta.name)
+        exp_field = through.experiment
+        exp_id = experiment.db_object.exp_id
+
+        with self.__bound(), self.__db.atomic('IMMEDIATE'):
+            ids = find()
+            # The same (name, value) can appear multiple times, for example on different steps
+            missing = list({key(row): row for row in rows if key(row) not in ids}.values())
+            if missing:
+                for batch in chunked(missing, ExperimentDB.BATCH_SIZE):
+                    model.insert_many(batch).execute()
+                ids = find()
+
+            row_ids = list(dict.fromkeys(ids[key(row)] for row in rows))
+            linked = set()
+            for batch in chunked(row_ids, ExperimentDB.BATCH_SIZE):
+                query = through.select(own_field).where(exp_field == exp_id, own_field.in_(batch))
+                linked.update(link_id for link_id, in query.tuples())
+            links = [{own_field.name: row_id, exp_field.name: exp_id} for row_id in row_ids
+                     if row_id not in linked]
+            for batch in chunked(links, ExperimentDB.BATCH_SIZE):
+                through.insert_many(batch).execute()
+
+    def get_experiment(self, identifier: int):
+        with self.__bound():
+            return Experiment.get(Experiment.exp_id == identifier)
 
 
 class BaseModel(Model):
@@ -147,6 +348,14 @@ class Result(BaseModel):
     theta = IntegerField(null=True)
     experiments = ManyToManyField(Experiment, backref='results')
 
+    class Meta:
+        indexes = ((('name', 'value', 'theta'), True),)
+
+
+# SQLite considers the NULLs distinct on unique indexes, the results without theta need their own
+Result.add_index(Result.index(Result.name, Result.value, unique=True,
+                              where=Result.theta.is_null()))
+
 
 class Param(BaseModel):
     """ Param model
@@ -157,3 +366,10 @@ class Param(BaseModel):
     name = CharField()
     value = CharField()
     experiments = ManyToManyField(Experiment, backref='params')
+
+    class Meta:
+        indexes = ((('name', 'value'), True),)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ExperimentDB._after_fork)
@@ -9,10 +9,27 @@ import subprocess
 import sys
 
 from . import experiment as exps
+from . import profiling
 
 
 def experiment(logger, out_path="./out", explanation: str = exps.experiment.DONT_WRITE_TK,
-               notification: bool = False, db_path=None):
+               notification: bool = False, db_path=None, db_pragmas='default', profile=None,
+               profile_options: dict = None):
+    """ Decorator that runs the function as an experiment.
+
+    Args:
+        logger: Python logger object.
+        out_path (str): Folder of the experiments.
+        explanation (str): Explanation of the experiment.
+        notification (bool): If True, notifies the end of the experiment.
+        db_path (str): Name of the database.
+        db_pragmas (str | dict): Pragmas of the database.
+        profile (str | Iterable[str]): Profilers used while the function runs, see
+                                       profiling.PROFILERS. Their summaries are saved on
+                                       experiment.json and their metrics on the database.
+        profile_options (dict): Arguments of the profilers, {mode => {argument => value}}, for
+                                example {"sampling": {"interval": 0.005}}.
+    """
     def decorator(func):
         """ Decorator, make a sound after the function is finished
 
@@ -25,11 +42,26 @@ def experiment(logger, out_path="./out", explanation: str = exps.experiment.DONT
 
         def wrapper(*args, **kwargs):
             exp = exps.experiment.Experiment(out_path, logger=logger, explanation=explanation,
-                                             database_name=db_path)
+                                             database_name=db_path, database_pragmas=db_pragmas)
             exp.init()
 
+            profilers = profiling.create_profilers(profile or (), profile_options)
+            for profiler in profilers.values():
+                profiler.start()
+
             kwargs["exp"] = exp
-            res = func(*args, **kwargs)
+            try:
+                res = func(*args, **kwargs)
+            finally:
+                if profilers:
+                    path = exp.path if os.path.isdir(exp.path) else None
+                    summary, profile_metrics = {}, {}
+                    for mode, profiler in reversed(list(profilers.items())):
+                        summary[mode], mode_metrics = profiler.stop(path)
+                        profile_metrics.update(mode_metrics)
+
+                    exp.profile = summary
+                    exp.add_metrics(profile_metrics)
 
             exp.finish()
 
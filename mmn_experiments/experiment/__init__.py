@@ -3,6 +3,7 @@
 """
 
 from .experiment import Experiment
+from .reader import ResultReader
 from importlib import resources
 
 try:
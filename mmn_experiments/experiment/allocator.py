@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+""" Experiment number allocation module.
+
+The number of a new experiment is obtained from a counter file saved on the root folder of the
+experiments. The number is claimed creating the folder of the experiment, the creation of a folder
+is atomic, so two processes starting at the same time can not get the same number. The folder is
+only scanned when the counter file does not exist (folders created with older versions).
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Optional
+import glob
+import os
+import threading
+
+COUNTER_FILE = ".exp_counter"
+
+
+def next_experiment(path: str, claim: bool = True) -> int:
+    """ Gets the number of the next experiment of the folder.
+
+    Args:
+        path (str): Root folder of the experiments.
+        claim (bool): If True the folder of the experiment is created, and the number can not be
+                      obtained by any other experiment.
+
+    Returns:
+        Integer with the number of the experiment.
+    """
+    last = _read_counter(path)
+    if last is None:
+        last = _scan_last(path)
+
+    num_exp = last + 1
+    if claim:
+        os.makedirs(path, exist_ok=True)
+        while True:
+            try:
+                os.mkdir(os.path.join(path, "exp_" + str(num_exp)))
+                break
+            except FileExistsError:
+                num_exp += 1
+
+        _write_counter(path, num_exp)
+    else:
+        while os.path.exists(os.path.join(path, "exp_" + str(num_exp))):
+            num_exp += 1
+
+    return num_exp
+
+
+def _read_counter(path: str) -> Optional[int]:
+    try:
+        with open(os.path.join(path, COUNTER_FILE), "r") as counter_file:
+            return int(counter_file.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_counter(path: str, num_exp: int) -> None:
+    """ Replaces atomically the counter file.
+
+    Concurrent writers can leave a lower value than the last claimed number. It is not a problem,
+    the claim skips the folders that already exist.
+    """
+    tmp_path = os.path.join(path, f"{COUNTER_FILE}.{os.getpid()}.{threading.get_ident()}")
+
+    with open(tmp_path, "w") as counter_file:
+        counter_file.write(str(num_exp))
+    os.replace(tmp_path, os.path.join(path, COUNTER_FILE))
+
+
+def _scan_last(path: str) -> int:
+    """ Gets the last experiment number scanning the folder. Used for legacy folders.
+
+    Returns:
+        Integer with the number of the last experiment, 0 if there is no experiment.
+    """
+    last = 0
+    for exp_path in glob.iglob(os.path.join(path, "exp_*")):
+        number = os.path.split(exp_path)[-1].split(".")[0].split("_")[-1]
+        if number.isdigit():
+            last = max(last, int(number))
+
+    return last
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+""" Packed archive module.
+
+This module contains a storage that appends all the files saved by an experiment into a few large
+files (packs) instead of a file for every result. Every pack contains the files one after the other
+and, when closed, an index at the end of the file.
+
+Format of a pack:
+    Record: MAGIC, header length (uint32), header (JSON: path, name, type, length), content.
+    Index (written when the pack is closed): JSON list with the header and the offset of the
+    content of every record, length of the index (uint64) and INDEX_MAGIC.
+
+If a pack has no index, because the process was killed, the records are found reading the headers.
+
+The packs can be unpacked to the usual folder layout with:
+    python -m mmn_experiments.experiment.archive exp_N [output_folder]
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Dict, List, Tuple
+import argparse
+import glob
+import json
+import os
+import struct
+import threading
+
+MAGIC = b"MMNPACK1"
+INDEX_MAGIC = b"MMNINDX1"
+PACK_PATTERN = "results_*.pack"
+
+_HEADER_LEN = struct.Struct("<I")
+_INDEX_LEN = struct.Struct("<Q")
+
+
+def _pack_name(number: int) -> str:
+    return f"results_{number:05d}.pack"
+
+
+class ArchiveWriter:
+    """ Appends files to packs.
+
+    Args:
+        folder (str): Folder where the packs are saved.
+        max_size (int): Size in bytes, when a pack reaches it a new pack is started.
+    """
+
+    def __init__(self, folder: str, max_size: int = 2 ** 30):
+        self.__folder = folder
+        self.__max_size = max_size
+        self.__lock = threading.Lock()
+        self.__file = None
+        self.__index: List[dict] = []
+        self.__number = len(glob.glob(os.path.join(folder, PACK_PATTERN)))
+
+    def write(self, path: str, name: str, content: bytes, storage_type: str = None) -> None:
+        """ Appends a file to the current pack.
+
+        Args:
+            path (str): Path of the file, relative to the folder of the experiment.
+            name (str): Name of the file, with the extension.
+            content (bytes): Content of the file.
+            storage_type (str): Type of the data saved.
+        """
+        header = {'path': path, 'name': name, 'type': storage_type, 'length': len(content)}
+        header_bytes = json.dumps(header).encode("utf-8")
+
+        with self.__lock:
+            pack = self.__open()
+            pack.write(MAGIC + _HEADER_LEN.pack(len(header_bytes)) + header_bytes)
+            header['offset'] = pack.tell()
+            pack.write(content)
+            pack.flush()
+            self.__index.append(header)
+
+            if pack.tell() >= self.__max_size:
+                self.__close_pack()
+
+    def close(self) -> None:
+        """ Writes the index of the current pack and closes it. """
+        with self.__lock:
+            self.__close_pack()
+
+    def __open(self):
+        if self.__file is None:
+            os.makedirs(self.__folder, exist_ok=True)
+            self.__file = open(os.path.join(self.__folder, _pack_name(self.__number)), "xb")
+            self.__index = []
+
+        return self.__file
+
+    def __close_pack(self) -> None:
+        if self.__file is None:
+            return
+
+        index = json.dumps(self.__index).encode("utf-8")
+        self.__file.write(index + _INDEX_LEN.pack(len(index)) + INDEX_MAGIC)
+        self.__file.close()
+
+        self.__file = None
+        self.__number += 1
+
+
+def read_pack_index(pack_path: str) -> List[dict]:
+    """ Reads the index of a pack, or rebuilds it from the headers if it was not closed.
+
+    Args:
+        pack_path (str): Path of the pack.
+
+    Returns:
+        List with the entries of the pack: {path, name, type, length, offset}.
+    """
+    trailer_len = _INDEX_LEN.size + len(INDEX_MAGIC)
+
+    with open(pack_path, "rb") as pack:
+        pack.seek(0, os.SEEK_END)
+        size = pack.tell()
+
+        if size >= trailer_len:
+            pack.seek(size - trailer_len)
+            trailer = pack.read(trailer_len)
+            if trailer[-len(INDEX_MAGIC):] == INDEX_MAGIC:
+                index_len, = _INDEX_LEN.unpack(trailer[:_INDEX_LEN.size])
+                pack.seek(size - trailer_len - index_len)
+                return json.loads(pack.read(index_len).decode("utf-8"))
+
+        index = []
+        pack.seek(0)
+        prefix_len = len(MAGIC) + _HEADER_LEN.size
+        while True:
+            prefix = pack.read(prefix_len)
+            if len(prefix) < prefix_len or prefix[:len(MAGIC)] != MAGIC:
+                break
+            header_len, = _HEADER_LEN.unpack(prefix[len(MAGIC):])
+            header = json.loads(pack.read(header_len).decode("utf-8"))
+            header['offset'] = pack.tell()
+            if header['offset'] + header['length'] > size:  # Record partially written
+                break
+
+            index.append(header)
+            pack.seek(header['length'], os.SEEK_CUR)
+
+        return index
+
+
+class ArchiveReader:
+    """ Random access to the files saved on the packs of an experiment.
+
+    Args:
+        folder (str): Folder of the experiment, containing the packs.
+    """
+
+    def __init__(self, folder: str):
+        self.__folder = folder
+        self.__entries: Dict[Tuple[str, str], Tuple[str, dict]] = {}
+
+        for pack_path in sorted(glob.glob(os.path.join(folder, PACK_PATTERN))):
+            for entry in read_pack_index(pack_path):
+                self.__entries[(entry['path'], entry['name'])] = (pack_path, entry)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __iter__(self):
+        return iter(self.__entries.keys())
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self.__entries
+
+    def entries(self) -> List[dict]:
+        """ Entries of all the files: {path, name, type, length, offset}. """
+        return [entry for _, entry in self.__entries.values()]
+
+    def read(self, path: str, name: str) -> bytes:
+        """ Reads the content of a file.
+
+        Args:
+            path (str): Path of the file, relative to the folder of the experiment.
+            name (str): Name of the file, with the extension.
+
+        Returns:
+            Content of the file.
+
+        Raises:
+            KeyError if the file is not on the packs.
+        """
+        pack_path, entry = self.__entries[(path, name)]
+
+        with open(pack_path, "rb") as pack:
+            pack.seek(entry['offset'])
+            return pack.read(entry['length'])
+
+    def unpack(self, output: str = None) -> None:
+        """ Writes the files of the packs with the usual folder layout.
+
+        Args:
+            output (str): Folder where the files are written. By default the folder of the packs.
+        """
+        output = output if output is not None else self.__folder
+
+        for path, name in self.__entries:
+            folder = os.path.join(output, path)
+            os.makedirs(folder, exist_ok=True)
+
+            with open(os.path.join(folder, name), "wb") as out_file:
+                out_file.write(self.read(path, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unpacks the results of an experiment.")
+    parser.add_argument("folder", help="Folder of the experiment, containing the packs.")
+    parser.add_argument("output", nargs="?", default=None,
+                        help="Output folder, by default the folder of the experiment.")
+    args = parser.parse_args()
+
+    ArchiveReader(args.folder).unpack(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+""" Array store module.
+
+This module contains a binary storage for the numeric results of an experiment (coordinates,
+columns, ...). The arrays saved on the same folder form a series: they are grouped in chunks,
+every chunk is concatenated on a single file (shard) and an index keeps the position of every array
+inside the shards. The shards are numpy files, memory-mapped when read, or compressed numpy files.
+
+Layout of a series folder:
+    index.jsonl: One line for every array, {name, shard, file, start, stop}.
+    chunk_00000.npy, chunk_00001.npy, ...: Arrays concatenated on the first axis.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Dict, List
+import json
+import os
+import threading
+
+import numpy as np
+
+INDEX_FILE = "index.jsonl"
+FORMATS = ("npy", "npz")
+
+
+class ArrayStore:
+    """ Appends arrays to chunked series of files.
+
+    The arrays are kept on memory until a chunk is full, when the chunk is written. The pending
+    arrays are written when the store is flushed or closed.
+
+    Args:
+        root (str): Root folder, the series are identified by a path relative to it.
+        chunk_size (int): Number of arrays of every shard.
+        compress (bool): If True the shards are compressed (npz), and can not be memory-mapped.
+    """
+
+    def __init__(self, root: str, chunk_size: int = 64, compress: bool = False):
+        self.__root = root
+        self.__chunk_size = max(chunk_size, 1)
+        self.__extension = "npz" if compress else "npy"
+        self.__series: Dict[str, dict] = {}
+        self.__lock = threading.Lock()
+
+    def append(self, path: str, array: np.ndarray, name: str = None) -> str:
+        """ Appends an array to a series.
+
+        Args:
+            path (str): Path of the series, relative to the root.
+            array (np.ndarray): Array to append, copied.
+            name (str): Name of the array. If None the position on the series is used.
+
+        Returns:
+            Name of the array.
+        """
+        # Copied, the caller can reuse the array before the chunk is written
+        array = np.array(array, copy=True)
+        if array.ndim == 0:
+            array = array.reshape(1)
+
+        with self.__lock:
+            series = self.__get_series(path)
+            pending = series['pending']
+
+            if len(pending) > 0 and (pending[0][1].dtype != array.dtype or
+                                     pending[0][1].shape[1:] != array.shape[1:]):
+                self.__write_chunk(path, series)
+
+            if name is None:
+                name = str(series['count'])
+            series['count'] += 1
+            series['pending'].append((name, array))
+
+            if len(series['pending']) >= self.__chunk_size:
+                self.__write_chunk(path, series)
+
+        return name
+
+    def flush(self) -> None:
+        """ Writes the arrays pending of all the series. """
+        with self.__lock:
+            for path, series in self.__series.items():
+                self.__write_chunk(path, series)
+
+    def close(self) -> None:
+        """ Writes the arrays pending and forgets the state of the series. """
+        self.flush()
+
+        with self.__lock:
+            self.__series = {}
+
+    def __get_series(self, path: str) -> dict:
+        if path not in self.__series:
+            folder = os.path.join(self.__root, path)
+            index = read_index(folder) if os.path.isdir(folder) else []
+
+            self.__series[path] = {
+                'count': len(index),
+                'shard': max([entry['shard'] for entry in index], default=-1) + 1,
+                'pending': []
+            }
+
+        return self.__series[path]
+
+    def __write_chunk(self, path: str, series: dict) -> None:
+        pending = series['pending']
+        if len(pending) == 0:
+            return
+
+        folder = os.path.join(self.__root, path)
+        os.makedirs(folder, exist_ok=True)
+
+        shard = series['shard']
+        shard_name = f"chunk_{shard:05d}.{self.__extension}"
+        chunk = np.concatenate([array for _, array in pending])
+
+        tmp_path = os.path.join(folder, "." + shard_name)
+        with open(tmp_path, "wb") as shard_file:
+            if self.__extension == "npz":
+                np.savez_compressed(shard_file, data=chunk)
+            else:
+                np.save(shard_file, chunk)
+        os.replace(tmp_path, os.path.join(folder, shard_name))
+
+        lines = []
+        start = 0
+        for name, array in pending:
+            lines.append(json.dumps({'name': name, 'shard': shard, 'file': shard_name,
+                                     'start': start, 'stop': start + len(array)}))
+            start += len(array)
+
+        with open(os.path.join(folder, INDEX_FILE), "a") as index_file:
+            index_file.write("\n".join(lines) + "\n")
+
+        series['shard'] = shard + 1
+        series['pending'] = []
+
+
+def read_index(folder: str) -> List[dict]:
+    """ Reads the index of a series.
+
+    Args:
+        folder (str): Folder of the series.
+
+    Returns:
+        List with an entry for every array: {name, shard, file, start, stop}.
+    """
+    index_path = os.path.join(folder, INDEX_FILE)
+    if not os.path.isfile(index_path):
+        return []
+
+    with open(index_path, "r") as index_file:
+        return [json.loads(line) for line in index_file if line.strip()]
+
+
+def load_shard(folder: str, file_name: str, mmap: bool = True) -> np.ndarray:
+    """ Loads a shard of a series. The npy shards are memory-mapped.
+
+    Args:
+        folder (str): Folder of the series.
+        file_name (str): Name of the shard file.
+        mmap (bool): If True the npy shards are memory-mapped instead of loaded.
+
+    Returns:
+        Numpy array with the content of the shard.
+    """
+    path = os.path.join(folder, file_name)
+
+    if file_name.endswith(".npz"):
+        with np.load(path) as shard:
+            return shard['data']
+
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def read_array(folder: str, name: str, mmap: bool = True) -> np.ndarray:
+    """ Reads an array of a series.
+
+    Args:
+        folder (str): Folder of the series.
+        name (str): Name of the array.
+        mmap (bool): If True the array is a view of the memory-mapped shard.
+
+    Returns:
+        Numpy array.
+
+    Raises:
+        KeyError if the series has no array with the name.
+    """
+    for entry in reversed(read_index(folder)):
+        if entry['name'] == name:
+            return load_shard(folder, entry['file'], mmap)[entry['start']:entry['stop']]
+
+    raise KeyError(f"Array {name} not found on {folder}.")
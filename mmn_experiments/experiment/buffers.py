@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+""" Buffer pool module.
+
+This module contains a pool of numpy arrays reused between the savings of images with the same
+shape, avoiding to allocate new memory for every image saved.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Tuple
+import contextlib
+import threading
+
+import numpy as np
+
+
+class BufferPool:
+    """ Pool of numpy arrays grouped by shape and type.
+
+    An array acquired is not given to any other caller until is released, so the pool can be used
+    from multiple threads.
+
+    Args:
+        max_buffers (int): Maximum number of free arrays kept for every shape and type.
+    """
+
+    def __init__(self, max_buffers: int = 4):
+        self.__max_buffers = max_buffers
+        self.__free = {}
+        self.__lock = threading.Lock()
+
+    def acquire(self, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """ Gets an array, with undefined content, of the shape and type. """
+        key = (tuple(shape), np.dtype(dtype))
+
+        with self.__lock:
+            free = self.__free.get(key)
+            if free:
+                return free.pop()
+
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer: np.ndarray) -> None:
+        """ Returns an array to the pool. """
+        key = (buffer.shape, buffer.dtype)
+
+        with self.__lock:
+            free = self.__free.setdefault(key, [])
+            if len(free) < self.__max_buffers:
+                free.append(buffer)
+
+    @contextlib.contextmanager
+    def buffer(self, shape: Tuple[int, ...], dtype):
+        """ Context manager that acquires an array and releases it at the exit. """
+        buffer = self.acquire(shape, dtype)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def clear(self) -> None:
+        """ Frees all the arrays of the pool. """
+        with self.__lock:
+            self.__free = {}
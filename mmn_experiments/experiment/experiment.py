@@ -7,28 +7,51 @@ is to be able to save results easily with an standard format.
 Written by: Miquel Miró Nicolau
 """
 from typing import Union, Tuple, List
+import contextlib
+import io
 import os
-import glob
-import pickle
 import re
 import time
 import datetime
 import warnings
 import json
+import threading
 
 from collections.abc import Iterable
+from concurrent import futures
 
-import cv2
 import numpy as np
-from matplotlib import pyplot as plt
 
 from ..data import dades
 from ..database_model import database
+from . import allocator, archive, arrays, buffers, metrics, reader, serialization, spans, writer
 
 Num = Union[int, float]
-DataExperiment = Union[dades.Data, List[dades.Data]]
+DataExperiment = Union[dades.Data, dades.DataBatch, List[dades.Data]]
 READ_FROM_KEYBOARD = True
 DONT_WRITE_TK = "REM"
+DEFAULT_COLORMAP = 'viridis'
+
+# Default options of every image format, {format => {option => value}}. The options are the names of
+# the cv2.IMWRITE_* flags without the prefix, for example PNG_COMPRESSION.
+IMAGE_FORMATS = {
+    'png': {},  # The default of OpenCV is already the fastest compression level
+    'jpg': {'JPEG_QUALITY': 95},
+    'webp': {'WEBP_QUALITY': 101},  # A quality above 100 is lossless
+    'npy': {},  # Raw numpy array, without encoding
+}
+_FORMAT_ALIASES = {'jpeg': 'jpg'}
+
+# Types saved as arrays of numbers
+NUMERIC_TYPES = (dades.StorageType.COORDINATES, dades.StorageType.COORDINATES_VALUES,
+                 dades.StorageType.SQUARES, dades.StorageType.ELLIPSES, dades.StorageType.COLUMN)
+
+# Types whose saving is bounded by the CPU (image encoding)
+_CPU_BOUND_TYPES = frozenset((dades.StorageType.COLOR_IMAGE, dades.StorageType.BINARY_IMAGE,
+                              dades.StorageType.COORDINATES_IMAGE,
+                              dades.StorageType.COORDINATES_VALUES_IMAGE))
+
+_COLORMAP_LUTS = {}
 
 
 class Experiment:
@@ -39,21 +62,53 @@ class Experiment:
 
     Args:
         path (str): Path where the different experiments will be saved.
-        num_exp (int): The number of experiment. If the argument has the default value search check
-                       the folder for the last experiment.
+        num_exp (int): The number of experiment. If the argument has the default value the next
+                       free number of the folder is claimed.
+        database_name (str): Name of the SQLite database, saved on the path.
+        database_pragmas (str | dict): Profile of pragmas or pragmas of the database, see
+                                       database.PRAGMA_PROFILES.
+        metrics_buffer_size (int): Number of metrics kept in memory before writing them to the
+                                   database. With 0 the metrics are written immediately.
+        metrics_flush_interval (float): Maximum seconds that a metric is kept in memory, checked
+                                        when new metrics are added.
+        image_format (str): Default format of the images saved, one of IMAGE_FORMATS. Used when the
+                            name of the data has no extension.
+        image_options (dict): Options of the image format, replacing the defaults of
+                              IMAGE_FORMATS. See the cv2.IMWRITE_* flags.
+        array_storage (str): Storage of the numeric results (coordinates, columns, ...). With "csv"
+                             every result is a text file, with "npy" or "npz" (compressed) the
+                             results of every folder are appended to a chunked binary series, see
+                             arrays.ArrayStore.
+        array_chunk_size (int): Number of results of every chunk of the binary series.
+        pack_results (bool): If True the files of the results are appended to a few large pack
+                             files instead of writing a file for every result, see
+                             archive.ArchiveWriter.
+        pack_max_size (int): Size in bytes of every pack file when pack_results is True.
+        pickle_compression (str): Compression of the pickled objects: None, "auto", "zstd", "lz4"
+                                  or "gzip". See serialization.resolve_codec.
+        pickle_buffers (bool): If True the buffers of the pickled objects (numpy arrays, ...) are
+                               written, without copying them, to a sidecar file. Needs Python 3.8.
+        async_save (bool): If True the results are saved on background threads. The data passed to
+                           save_result should not be modified after the call.
+        async_workers (int): Number of background threads used when async_save is True.
+        async_queue_size (int): Maximum number of results pending to be saved when async_save is
+                                True. When reached, save_result blocks until a result is written.
     """
 
     def __init__(self, path: str, logger, num_exp: int = -1, explanation: str = None,
-                 params=None, database_name: str = None):
-        if num_exp < 0:  # Is not set, we're going to get automatic the number
-            exps = list(glob.iglob(os.path.join(path, "exp_*")))
-            exps = sorted(exps,
-                          key=lambda x: float(os.path.split(x)[-1].split(".")[0].split("_")[-1]))
+                 params=None, database_name: str = None,
+                 database_pragmas: Union[str, dict] = 'default', metrics_buffer_size: int = 0,
+                 metrics_flush_interval: float = 30.0, image_format: str = 'png',
+                 image_options: dict = None, array_storage: str = 'csv',
+                 array_chunk_size: int = 64, pack_results: bool = False,
+                 pack_max_size: int = 2 ** 30, pickle_compression: str = None,
+                 pickle_buffers: bool = False, async_save: bool = False,
+                 async_workers: int = 1, async_queue_size: int = 64):
+        if READ_FROM_KEYBOARD and explanation is None:
+            explanation = input("Enter an explanation for the experiment: ")
 
-            if len(exps) > 0:
-                num_exp = int(os.path.split(exps[-1])[-1].split(".")[0].split("_")[-1]) + 1
-            else:
-                num_exp = 1
+        if num_exp < 0:  # Is not set, we're going to get automatic the number
+            num_exp = allocator.next_experiment(path, claim=explanation != DONT_WRITE_TK)
 
         self._logger = logger
         self._num_exp = num_exp
@@ -62,9 +117,6 @@ class Experiment:
         self._start_time = 0
         self._end_time = 0
 
-        if READ_FROM_KEYBOARD and explanation is None:
-            explanation = input("Enter an explanation for the experiment: ")
-
         self.__description = explanation
         self._extra_text = None
         self.__params = params
@@ -73,13 +125,85 @@ class Experiment:
 
         if database_name is not None:
             db = database.ExperimentDB()
-            db.start(os.path.join(path, database_name))
+            db.start(os.path.join(path, database_name), pragmas=database_pragmas)
         else:
             db = None
 
         self.__database_name = database_name
+        self.__database_pragmas = database_pragmas
         self.__database = db
         self.__database_object = None
+        self.__pending_metrics: List[metrics.MetricRecord] = []
+        self.__profile = None
+        self.__spans = spans.SpanRecorder()
+
+        self.__metrics_buffer_size = metrics_buffer_size
+        self.__metrics_flush_interval = metrics_flush_interval
+        self.__metrics = None
+        if db is not None and metrics_buffer_size > 0:
+            spill_path = None
+            if explanation != DONT_WRITE_TK:
+                spill_path = os.path.join(self._path, "metrics_buffer.jsonl")
+
+            self.__metrics = metrics.MetricBuffer(self.__write_metrics, size=metrics_buffer_size,
+                                                  interval=metrics_flush_interval,
+                                                  spill_path=spill_path)
+
+        if _FORMAT_ALIASES.get(image_format, image_format) not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format {image_format}.")
+        self.__image_format = image_format
+        self.__image_options = image_options or {}
+
+        if array_storage not in ('csv',) + arrays.FORMATS:
+            raise ValueError(f"Unknown array storage {array_storage}.")
+        self.__arrays = None
+        if array_storage != 'csv':
+            self.__arrays = arrays.ArrayStore(self._path, chunk_size=array_chunk_size,
+                                              compress=array_storage == 'npz')
+
+        self.__archive = None
+        if pack_results:
+            self.__archive = archive.ArchiveWriter(self._path, max_size=pack_max_size)
+
+        if pickle_buffers and not serialization.OUT_OF_BAND:
+            raise ValueError("The pickle buffers need the pickle protocol 5 (Python 3.8).")
+        self.__pickle_compression = serialization.resolve_codec(pickle_compression)
+        self.__pickle_buffers = pickle_buffers
+
+        self.__buffers = buffers.BufferPool()
+        self.__folders = set()
+        self.__counters = {}
+        self.__names_lock = threading.Lock()
+
+        self.__writer = None
+        if async_save:
+            self.__writer = writer.AsyncWriter(num_workers=async_workers,
+                                               queue_size=async_queue_size)
+
+    def __getstate__(self):
+        """ State used to send the experiment to the batch saving processes.
+
+        The database and the background writer are bound to the process that created the
+        experiment, so they are not copied.
+        """
+        state = self.__dict__.copy()
+        state['_Experiment__writer'] = None
+        state['_Experiment__database'] = None
+        state['_Experiment__database_object'] = None
+        state['_Experiment__metrics'] = None
+        state['_Experiment__arrays'] = None
+        state['_Experiment__archive'] = None
+        del state['_Experiment__names_lock']
+        del state['_Experiment__buffers']
+        del state['_Experiment__spans']
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__names_lock = threading.Lock()
+        self.__buffers = buffers.BufferPool()
+        self.__spans = spans.SpanRecorder()
 
     @property
     def db_object(self):
@@ -93,6 +217,42 @@ class Experiment:
     def path(self):
         return self._path
 
+    @property
+    def profile(self) -> dict:
+        """ Summary of the profilers of the experiment, saved on experiment.json. """
+        return self.__profile
+
+    @profile.setter
+    def profile(self, value: dict):
+        self.__profile = value
+
+    @property
+    def span_times(self) -> dict:
+        """ Aggregated times of the spans, in seconds, see spans.SpanRecorder.summary. """
+        return self.__spans.summary()
+
+    def span(self, name: str) -> spans.Span:
+        """ Measures the time of a phase of the experiment.
+
+        The spans can be nested, the times are aggregated by the path of the span and saved on
+        experiment.json, the resume and the database when the experiment finishes.
+
+        Example:
+            with exp.span("data_loading"):
+                ...
+
+            @exp.span("step")
+            def step():
+                ...
+
+        Args:
+            name (str): Name of the span.
+
+        Returns:
+            Span, to use as a context manager or a decorator.
+        """
+        return self.__spans.span(name)
+
     @property
     def description(self):
         return self.__description
@@ -114,8 +274,7 @@ class Experiment:
     def results(self, value: dict):
         self._logger.info(f"Metrics {value}")
 
-        if self.__database is not None:
-            self.__database.add_metrics(self, value)
+        self.__add_metrics_db(value)
 
         self.__results = value
 
@@ -149,22 +308,46 @@ class Experiment:
         return self._num_exp
 
     def init(self):
-        """ Initializes the experiment.  """
+        """ Initializes the experiment.
+
+        If there is a database the experiment is added to it, so the metrics can be written during
+        the experiment. The end date is updated when the experiment finishes.
+        """
 
         if self.__description != DONT_WRITE_TK:
             Experiment._create_folder(self._path)
         self._start_time = time.time()
 
+        if self.__database is not None and self.__database_object is None:
+            self.__database.start_experiment(self)
+
         self._logger.info(f"Experiment {self._num_exp} has started." + self.__get_extra_info())
 
     def finish(self, results=None):
         """ Finishes the experiment.
 
+        If the results are saved asynchronously waits until all of them are written. The experiment
+        is finished even if some of them failed, and the error is raised afterwards.
+
         Raises:
             RuntimeError when the experiment was not started
+            The first exception raised saving a result asynchronously, if any.
         """
         if self._start_time == 0:
             raise RuntimeError("ERROR: Trying to finish a non initialized experiment.")
+
+        try:
+            if self.__writer is not None:
+                self.__writer.close()
+        finally:
+            self.__close(results)
+
+    def __close(self, results=None):
+        """ Closes the storages of the results and writes the information of the experiment. """
+        if self.__arrays is not None:
+            self.__arrays.close()
+        if self.__archive is not None:
+            self.__archive.close()
         self._end_time = time.time()
 
         path = os.path.join(self._path, "experiment_resume.txt")
@@ -175,26 +358,62 @@ class Experiment:
         if self.__database is not None:
             self.__database.add_experiment(experiment=self, params=self.params, results=results)
 
+            records = self.__pending_metrics + [metrics.MetricRecord(name, value, None, None)
+                                                for name, value in self.__spans.metrics().items()]
+            if records:
+                self.__database.add_metric_records(self, records)
+            self.__pending_metrics = []
+
+        if self.__metrics is not None:
+            self.__metrics.close()
+        self.__buffers.clear()
+
         with open(os.path.join(self._path, "experiment.json"), "w") as outfile:
             json.dump(self.export(), outfile)
 
         self._logger.info(
             f"Experiment {self._num_exp} finished after {self.time}.")
 
-    def add_metrics(self, metrics: dict, theta: int = None):
+    def add_metrics(self, metrics: dict, theta: int = None, step: int = None):
         """ Add metrics to experiment.
 
         Add metrics to the experiment. In the case that there is a database object also update it
-        to contain this information.
+        to contain this information. If the metrics are buffered, they are written to the database
+        when the buffer is full, and at the end of the experiment. The metrics added before the
+        experiment is on the database are written when it is finished.
 
         Args:
             metrics: Dictionary containing the metrics in a {metric_name => metric_value}ç
             theta: (optional) Integer indicating the theta value of the experiment.
+            step: (optional) Integer with the step of the metrics. Only saved on the buffer file.
         """
         self._logger.info(f"Metrics {metrics}")
 
-        if self.__database is not None:
-            self.__database.add_metrics(self, metrics, theta=theta)
+        self.__add_metrics_db(metrics, theta=theta, step=step)
+
+    def flush_metrics(self):
+        """ Writes the buffered metrics to the database.
+
+        The metrics are kept in the buffer while the experiment is not on the database, before
+        calling finish.
+        """
+        if self.__metrics is not None and self.__database_object is not None:
+            self.__metrics.flush()
+
+    def __add_metrics_db(self, metrics_values: dict, theta: int = None, step: int = None):
+        if self.__metrics is not None:
+            self.__metrics.add(metrics_values, theta=theta, step=step)
+            if self.__metrics.due():
+                self.flush_metrics()
+        elif self.__database is not None and self.__database_object is None:
+            # The experiment is added to the database when finished
+            self.__pending_metrics += [metrics.MetricRecord(name, value, theta, step)
+                                       for name, value in metrics_values.items()]
+        elif self.__database is not None:
+            self.__database.add_metrics(self, metrics_values, theta=theta)
+
+    def __write_metrics(self, records: List[metrics.MetricRecord]):
+        self.__database.add_metric_records(self, records)
 
     def set_explanation(self, explanation: str):
         """ Warning: Deprecated
@@ -250,7 +469,11 @@ class Experiment:
 
         resum += self.__get_extra_info()
 
-        resum += f"\n\t\t\tElapsed time {self.time} minutes"
+        resum += f"\n\t\t\tElapsed time {self.time} seconds"
+
+        for path, stats in self.span_times.items():
+            resum += f"\n\t\t\tSpan {path}: {stats['total']:.6f} seconds, {stats['count']} " \
+                     f"times (min {stats['min']:.6f}, max {stats['max']:.6f})"
 
         date_str = datetime.datetime.fromtimestamp(self._end_time).strftime("%d/%m/%Y %H:%M:%S")
 
@@ -258,16 +481,28 @@ class Experiment:
 
         return resum
 
-    def save_result(self, dada: DataExperiment):
+    def save_result(self, dada: DataExperiment, num_workers: int = 1, chunk_size: int = 16):
         """
-        
+
+        When the experiment saves asynchronously the data is enqueued and the errors of previously
+        enqueued data are raised. A dades.DataBatch is saved at once, see __save_data_batch.
+
         Args:
             dada:
+            num_workers: Number of workers used to save a list of data. With more than one worker
+                         the images are encoded on a pool of processes and the rest of data is
+                         written on a pool of threads.
+            chunk_size: Number of data sent at once to every worker.
 
         """
         if self.__description != DONT_WRITE_TK:
             if isinstance(dada, List):
-                self.__save_results_batch(dada)
+                self.__save_results_batch(dada, num_workers=num_workers, chunk_size=chunk_size)
+            elif isinstance(dada, dades.DataBatch):
+                self.__save_data_batch(dada, num_workers=num_workers, chunk_size=chunk_size)
+            elif self.__writer is not None:
+                # Named before enqueued, so the indices follow the order of the calls
+                self.__writer.submit(self.__save_result_single, self.__name_batch([dada])[0])
             else:
                 self.__save_result_single(dada)
 
@@ -278,44 +513,168 @@ class Experiment:
             dada:
 
         """
-        storage_type = dada.storage_type
+        saver = Experiment.__SAVERS.get(dada.storage_type)
+
+        if saver is not None:
+            saver(self, dada)
+        elif dada.storage_type in dades.CUSTOM_TYPES:
+            self._save_custom(dada)
 
-        if dades.Data.is_image(storage_type):
-            self._save_data_img(dada)
-        elif storage_type == dades.STORAGES_TYPES[2]:
-            self._save_string(dada)
-        elif storage_type == dades.STORAGES_TYPES[3]:
-            self.__save_object(dada)
-        elif storage_type in (dades.STORAGES_TYPES[4], dades.STORAGES_TYPES[7]):
-            self._save_coordinates(dada)
-        elif storage_type == dades.STORAGES_TYPES[1]:
-            self._save_coordinates_image(dada)
-        elif storage_type == dades.STORAGES_TYPES[10]:
-            self._save_coordinates_values_images(dada)
+    def _save_custom(self, data: dades.Data) -> None:
+        """ Saves data of a custom storage type with the save function of its plugin.
+
+        Args:
+            data (dades.Data): Data with a storage type registered with
+                               dades.register_storage_type.
+        """
+        plugin = dades.CUSTOM_TYPES[data.storage_type]
+        path, name = self._create_folders_for_data(data)
+
+        with self._open_output(data, path, name + plugin.extension) as handle:
+            plugin.save(data.data, handle)
 
     def __save_object(self, data: dades.Data):
         """ Pickle object
 
+        The buffers of the object are written to a sidecar file if the experiment is configured
+        with pickle_buffers. The object can be loaded with serialization.load_path.
         """
         path, name = self._create_folders_for_data(data)
+        file_name = name + '.pickle'
+        buffers = [] if self.__pickle_buffers else None
+
+        with self._open_output(data, path, file_name) as handle:
+            serialization.dump(data.data, handle, compression=self.__pickle_compression,
+                               buffers=buffers)
 
-        with open(path + "/" + name + '.pickle', 'wb') as handle:
-            pickle.dump(data.data, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        if buffers:
+            with self._open_output(data, path, file_name + serialization.BUFFERS_SUFFIX) as handle:
+                serialization.write_buffers(handle, buffers)
 
         return None
 
-    def __save_results_batch(self, datas: List[dades.Data]):
+    def __save_results_batch(self, datas: List[dades.Data], num_workers: int = 1,
+                             chunk_size: int = 16):
         """ Save data of the experiment.
 
-        Saves a list of multiples data.
+        Saves a list of multiples data. When more than one worker is used, the names of the data
+        without name are set before saving, in the order of the list, so the files are named as if
+        saved sequentially.
 
         Args:
             datas (List of data):
+            num_workers (int): Number of workers.
+            chunk_size (int): Number of data sent at once to every worker.
 
         Returns:
 
         """
-        [self.save_result(dat) for dat in datas]
+        if num_workers <= 1 or self.__writer is not None:
+            [self.save_result(dat) for dat in datas]
+            return
+
+        datas = self.__name_batch(Experiment.__flatten(datas))
+
+        # The packs can only be written by the process of the experiment
+        images = [dat for dat in datas if Experiment.__is_cpu_bound(dat.storage_type)
+                  and self.__archive is None]
+        others = [dat for dat in datas if not Experiment.__is_cpu_bound(dat.storage_type)
+                  or self.__archive is not None]
+
+        with futures.ProcessPoolExecutor(max_workers=num_workers) as processes, \
+                futures.ThreadPoolExecutor(max_workers=num_workers) as threads:
+            jobs = [processes.submit(self._save_results_chunk, chunk)
+                    for chunk in Experiment.__chunks(images, chunk_size)]
+            jobs += [threads.submit(self._save_results_chunk, chunk)
+                     for chunk in Experiment.__chunks(others, chunk_size)]
+
+            for job in futures.as_completed(jobs):
+                job.result()
+
+    def __save_data_batch(self, batch: dades.DataBatch, num_workers: int = 1,
+                          chunk_size: int = 16):
+        """ Saves the items of a batch.
+
+        The folder is created, and the indices of the items without name reserved, once for all
+        the batch. The items are saved on a single job or, with more than one worker, on the
+        workers of __save_results_batch. The items appended to the binary array storage are named
+        by the storage, so they are always saved on a single job, in order.
+
+        Args:
+            batch (dades.DataBatch): Batch of data.
+            num_workers (int): Number of workers.
+            chunk_size (int): Number of items sent at once to every worker.
+        """
+        path = os.path.join(self._path, batch.path)
+        self.__create_folder_once(path)
+
+        uses_index = self.__uses_index(batch)
+        names = batch.names
+        if names is None and uses_index:
+            first = self.__next_index(path, count=len(batch))
+            names = [str(first + i) for i in range(len(batch))]
+        elif names is None:
+            names = [None] * len(batch)
+        datas = batch.unbatch(names)
+
+        if self.__writer is not None:
+            self.__writer.submit(self._save_results_chunk, datas)
+        elif num_workers <= 1 or not uses_index:
+            self._save_results_chunk(datas)
+        else:
+            self.__save_results_batch(datas, num_workers=num_workers, chunk_size=chunk_size)
+
+    def _save_results_chunk(self, datas: List[dades.Data]) -> None:
+        """ Saves sequentially a chunk of data. Used by the batch workers. """
+        for dat in datas:
+            self.__save_result_single(dat)
+
+    def __name_batch(self, datas: List[dades.Data]) -> List[dades.Data]:
+        """ Sets a name to the data without it.
+
+        Args:
+            datas (List of data):
+
+        Returns:
+            List of data, all of them with name.
+        """
+        named = []
+        for dat in datas:
+            if dat.name is None and self.__uses_index(dat):
+                _, name = self._create_folders_for_data(dat)
+                dat = dat.renamed(name)
+            named.append(dat)
+
+        return named
+
+    def __uses_index(self, data: Union[dades.Data, dades.DataBatch]) -> bool:
+        """ Checks if the data, without name, is saved with the next index of its folder. """
+        if data.storage_type == dades.StorageType.STRING:
+            return False
+
+        return self.__arrays is None or data.storage_type not in NUMERIC_TYPES
+
+    @staticmethod
+    def __flatten(datas: List) -> List[dades.Data]:
+        flat = []
+        for dat in datas:
+            if isinstance(dat, List):
+                flat += Experiment.__flatten(dat)
+            else:
+                flat.append(dat)
+
+        return flat
+
+    @staticmethod
+    def __chunks(datas: List[dades.Data], chunk_size: int):
+        chunk_size = max(chunk_size, 1)
+
+        return [datas[i: i + chunk_size] for i in range(0, len(datas), chunk_size)]
+
+    @staticmethod
+    def __is_cpu_bound(storage_type: str) -> bool:
+        """ Checks if saving the storage type is bounded by the CPU (image encoding). """
+        return storage_type in _CPU_BOUND_TYPES
 
     def _save_coordinates_values_images(self, datas: dades.Data) -> None:
         """ Save image with value for coordinates.
@@ -327,6 +686,11 @@ class Experiment:
         Save an image with the values drawed over the original image in the points indicated by the
         coordinates.
 
+        The image is drawn on three working arrays, borrowed from the buffer pool of the experiment
+        and reused by the next images of the same shape: the drawing (float), the gray image and the
+        colormap output. A single buffer is not enough, the encoder needs the gray image and the
+        colormap output at the same time, but no full-size array is allocated after the first image.
+
         Args:
             datas:
 
@@ -337,17 +701,31 @@ class Experiment:
             Value error if the values and the coordinates are not of the same length.
         """
         image, coordinates, values = datas.data
-        image = np.copy(image)
 
         if len(coordinates) != len(values):
             raise ValueError("Coordinates and values should have the same length.")
 
-        image[image > values.max()] = values.max() + 5
+        max_value = values.max()
+        # The replacement value is converted to the type of the image, as when assigned to it
+        clip_value = np.array(max_value + 5).astype(image.dtype)
+
+        # Working arrays taken from the pool: the drawing (float), the gray image and the colormap
+        with self.__buffers.buffer(image.shape, np.float32) as curv_values, \
+                self.__buffers.buffer(image.shape, np.uint8) as curv_img, \
+                self.__buffers.buffer(image.shape[:2] + (3,), np.uint8) as color_img:
+            over_max = curv_img.view(bool)
+            np.greater(image, max_value, out=over_max)
+            np.copyto(curv_values, image, casting='unsafe')
+            np.copyto(curv_values, clip_value, where=over_max, casting='unsafe')
 
-        curv_img = Experiment._draw_points(image, coordinates, values, 0).astype(np.uint8) * 255
-        curv_img = Experiment.__apply_custom_colormap(curv_img)
+            Experiment._draw_points(curv_values, coordinates, values, 0, out=curv_values)
 
-        self.__save_img(datas, curv_img)
+            np.copyto(curv_img, curv_values, casting='unsafe')
+            np.multiply(curv_img, 255, out=curv_img, casting='unsafe')
+            Experiment.__apply_custom_colormap(curv_img, datas.colormap or DEFAULT_COLORMAP,
+                                               out=color_img)
+
+            self.__save_img(datas, color_img)
 
     def add_text(self, text: str) -> None:
         """
@@ -381,7 +759,10 @@ class Experiment:
         self.__save_img(data, res_image)
 
     def _save_coordinates(self, data: dades.Data) -> None:
-        """
+        """ Saves a numeric array.
+
+        The array is saved as a CSV file or, if the experiment has a binary array storage,
+        appended to the series of the path of the data.
 
         Args:
             data:
@@ -389,16 +770,25 @@ class Experiment:
         Returns:
 
         Raises:
-
-
+            ValueError if the data is not a numpy array.
         """
         dat = data.data
         if not isinstance(dat, np.ndarray):
             raise ValueError("Not a valid data for the coordinates.")
 
+        if self.__arrays is not None:
+            self.__arrays.append(data.path, dat, name=data.name)
+            return
+
         path, name = self._create_folders_for_data(data)
 
-        np.savetxt(os.path.join(path, name + ".csv"), dat, delimiter=",")
+        with self._open_output(data, path, name + ".csv") as handle:
+            np.savetxt(handle, dat, delimiter=",")
+
+    def flush_arrays(self) -> None:
+        """ Writes the arrays pending of the binary array storage. """
+        if self.__arrays is not None:
+            self.__arrays.flush()
 
     def _save_data_img(self, data: dades.Data) -> None:
         """ Save the image.
@@ -415,15 +805,50 @@ class Experiment:
         self.__save_img(data, data.data)
 
     def __save_img(self, data: dades.Data, image: np.ndarray):
+        """ Encodes and writes an image.
+
+        The format is the extension of the name of the data. If the name has no extension, the
+        format of the data is used, or otherwise the format of the experiment.
+
+        Args:
+            data (dades.Data): Data of the image.
+            image (np.ndarray): Image to save.
+        """
         path, name = self._create_folders_for_data(data)
 
-        if not re.match(".*\..{3}$", name):
-            name = name + ".png"
+        extension = re.match(r".*\.(.{3}|webp|jpeg|tiff)$", name, flags=re.IGNORECASE)
+        if extension is not None:
+            image_format = extension.group(1).lower()
+        else:
+            image_format = data.image_format or self.__image_format
+            name = name + "." + image_format
+        image_format = _FORMAT_ALIASES.get(image_format, image_format)
+
+        if image_format == 'npy':
+            with self._open_output(data, path, name) as handle:
+                np.save(handle, image)
+            return
+
+        import cv2
 
-        cv2.imwrite(os.path.join(path, name), image)
+        options = dict(IMAGE_FORMATS.get(image_format, {}))
+        if image_format == _FORMAT_ALIASES.get(self.__image_format, self.__image_format):
+            options.update(self.__image_options)
+        options.update(data.image_options or {})
+
+        params = []
+        for option, value in options.items():
+            params += [getattr(cv2, "IMWRITE_" + option), int(value)]
+
+        if self.__archive is None:
+            cv2.imwrite(os.path.join(path, name), image, params)
+        else:
+            _, encoded = cv2.imencode(os.path.splitext(name)[1], image, params)
+            with self._open_output(data, path, name) as handle:
+                handle.write(encoded)
 
     def _save_string(self, data: dades.Data) -> None:
-        """
+        """ Saves a text. The path of the data is the path of the file.
 
         Args:
             data:
@@ -431,14 +856,42 @@ class Experiment:
         Returns:
 
         """
-        path, _ = self._create_folders_for_data(data)
+        path, file_name = os.path.split(os.path.join(self._path, data.path))
+        self.__create_folder_once(path)
+
+        with self._open_output(data, path, file_name) as handle:
+            handle.write(data.data.encode("utf-8"))
+
+    @contextlib.contextmanager
+    def _open_output(self, data: dades.Data, path: str, file_name: str):
+        """ Opens, in binary mode, the file where a result is saved.
+
+        If the results are packed the content is kept on memory and appended to the pack at the
+        exit.
+
+        Args:
+            data (dades.Data): Data saved.
+            path (str): Folder of the file.
+            file_name (str): Name of the file, with extension.
+        """
+        if self.__archive is None:
+            with open(os.path.join(path, file_name), "wb") as handle:
+                yield handle
+        else:
+            handle = io.BytesIO()
+            yield handle
 
-        with open(path, "w") as text_file:
-            text_file.write(data.data)
+            rel_path = os.path.relpath(path, self._path).replace(os.sep, "/")
+            self.__archive.write("" if rel_path == "." else rel_path, file_name,
+                                 handle.getbuffer(), storage_type=data.storage_type)
 
     def _create_folders_for_data(self, data: dades.Data) -> Tuple[str, str]:
         """ Create recursively the folder tree.
 
+        The folders are only created the first time. If the data has no name, the name is the next
+        value of a counter of the folder. The counter starts with the number of elements found on
+        the folder the first time that is used.
+
         Args:
             data:
 
@@ -446,16 +899,39 @@ class Experiment:
 
         """
         path = os.path.join(self._path, data.path)
-
-        Experiment._create_folder(path)
+        self.__create_folder_once(path)
 
         name = data.name
         if name is None:
-            files = list(glob.iglob(os.path.join(path, "*")))
-            name = str(len(files))
+            name = str(self.__next_index(path))
 
         return path, name
 
+    def __next_index(self, path: str, count: int = 1) -> int:
+        """ Gets the next free index of the folder for data without name. Thread-safe.
+
+        Args:
+            path (str): Path of the folder.
+            count (int): Number of consecutive indices reserved.
+
+        Returns:
+            Integer with the first index.
+        """
+        with self.__names_lock:
+            if path not in self.__counters:
+                self.__counters[path] = len(os.listdir(path)) if os.path.isdir(path) else 0
+
+            index = self.__counters[path]
+            self.__counters[path] = index + count
+
+        return index
+
+    def __create_folder_once(self, path: str) -> None:
+        """ Creates the folder the first time that is used. The packed results need no folders. """
+        if self.__archive is None and path not in self.__folders:
+            Experiment._create_folder(path)
+            self.__folders.add(path)
+
     @staticmethod
     def _create_folder(path):
         """ Create recursively the folder tree.
@@ -467,70 +943,133 @@ class Experiment:
 
         """
 
-        if not os.path.exists(path):
-            os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
 
         return path
 
     @staticmethod
-    def _draw_points(img, points, values, side=0):
+    def _draw_points(img, points, values, side=0, out=None):
         """ Draw the value in the points position on the image. The drawing function used
         is a square, the side is the length of the square
 
+        The points are drawn in order, so when two squares overlap the value of the last point is
+        kept. The parts of the squares outside the image are not drawn.
+
         Args:
             img:
-            points:
-            values:
+            points: Array of (x, y) coordinates.
+            values: Value for every point or a single value for all of them.
             side:
+            out: (optional) Float array where the points are drawn, instead of a float copy of the
+                 image. It can be the image itself.
 
         Returns:
 
         """
-        mask = np.copy(img)
-        mask = mask.astype(np.float32)
+        mask = img.astype(np.float32) if out is None else out
 
-        i = 0
-        for point in points:
-            if isinstance(values, Iterable):
-                val = values[i]
-            else:
-                val = values
-            if side == 0:
-                mask[point[1], point[0]] = val
-            else:
-                mask[int(point[1] - side): int(point[1] + side),
-                int(point[0] - side): int(point[0] + side)] = val
-            i = i + 1
+        points = np.asarray(points)
+        if len(points) == 0:
+            return mask
+
+        if isinstance(values, Iterable):
+            values = np.asarray(values)[:len(points)]
+        else:
+            values = np.full(len(points), values)
+
+        if side == 0:
+            rows = points[:, 1].astype(np.intp)
+            cols = points[:, 0].astype(np.intp)
+            point_idx = np.arange(len(points))
+        else:
+            # Same limits than slicing [int(p - side): int(p + side)] for every point
+            starts = (points - side).astype(np.intp)
+            lengths = (points + side).astype(np.intp) - starts
+            offsets = np.arange(max(lengths.max(), 0))
+            shape = (len(points), len(offsets), len(offsets))
+
+            rows = np.broadcast_to(starts[:, 1, None, None] + offsets[None, :, None], shape)
+            cols = np.broadcast_to(starts[:, 0, None, None] + offsets[None, None, :], shape)
+
+            if (lengths == len(offsets)).all():
+                rows, cols = rows.ravel(), cols.ravel()
+                point_idx = np.repeat(np.arange(len(points)), len(offsets) ** 2)
+            else:  # Float points, the squares can have different sizes
+                inside = (offsets[None, :, None] < lengths[:, 1, None, None]) & \
+                         (offsets[None, None, :] < lengths[:, 0, None, None])
+                point_idx, _, _ = np.nonzero(inside)
+                rows, cols = rows[inside], cols[inside]
+
+        in_image = (rows >= 0) & (rows < mask.shape[0]) & (cols >= 0) & (cols < mask.shape[1])
+        values = values[point_idx[in_image]]
+        if mask.ndim > 2 and values.ndim == 1:  # A value for every point, on all the channels
+            values = values.reshape((-1,) + (1,) * (mask.ndim - 2))
+
+        mask[rows[in_image], cols[in_image]] = values
 
         return mask
 
     @staticmethod
-    def __apply_custom_colormap(image_gray, cmap=plt.get_cmap('viridis')):
+    def _colormap_lut(cmap=DEFAULT_COLORMAP) -> np.ndarray:
+        """ Gets the look-up table of a matplotlib CMAP.
+
+        The tables of the CMAPs identified by name are only computed the first time.
+
+        Args:
+            cmap: Name of the matplotlib colormap or colormap object.
+
+        Returns:
+            Numpy array of 256x1x3 with the BGR colors of the colormap.
+        """
+        lut = _COLORMAP_LUTS.get(cmap) if isinstance(cmap, str) else None
+
+        if lut is None:
+            from matplotlib import pyplot as plt
+
+            # Initialize the matplotlib color map
+            sm = plt.cm.ScalarMappable(cmap=cmap)
+
+            # Obtain linear color range
+            color_range = sm.to_rgba(np.linspace(0, 1, 256))[:, 0:3]  # color range RGBA => RGB
+            color_range = (color_range * 255.0).astype(np.uint8)  # [0,1] => [0,255]
+            lut = np.ascontiguousarray(color_range[:, ::-1]).reshape((256, 1, 3))  # RGB => BGR
+
+            if isinstance(cmap, str):
+                _COLORMAP_LUTS[cmap] = lut
+
+        return lut
+
+    @staticmethod
+    def __apply_custom_colormap(image_gray, cmap=DEFAULT_COLORMAP, out=None):
         """ Applies a CMAP from matplotlib to a gray-scale image.
 
         Args:
             image_gray:
-            cmap:
+            cmap: Name of the matplotlib colormap or colormap object.
+            out: (optional) Array of HxWx3 uint8 where the result is saved.
 
         Returns:
 
         """
+        import cv2
+
         assert image_gray.dtype == np.uint8, 'must be np.uint8 image'
         if image_gray.ndim == 3: image_gray = image_gray.squeeze(-1)
 
-        # Initialize the matplotlib color map
-        sm = plt.cm.ScalarMappable(cmap=cmap)
+        return cv2.applyColorMap(image_gray, Experiment._colormap_lut(cmap), out)
+
+    def reader(self, mmap: bool = True) -> reader.ResultReader:
+        """ Gets a reader of the results saved by the experiment.
 
-        # Obtain linear color range
-        color_range = sm.to_rgba(np.linspace(0, 1, 256))[:, 0:3]  # color range RGBA => RGB
-        color_range = (color_range * 255.0).astype(np.uint8)  # [0,1] => [0,255]
-        color_range = np.squeeze(
-            np.dstack([color_range[:, 2], color_range[:, 1], color_range[:, 0]]),
-            0)  # RGB => BGR
+        Args:
+            mmap (bool): If True the numpy arrays are memory-mapped instead of loaded.
 
-        # Apply colormap for each channel individually
-        channels = [cv2.LUT(image_gray, color_range[:, i]) for i in range(3)]
-        return np.dstack(channels)
+        Returns:
+            ResultReader of the folder of the experiment.
+        """
+        self.flush_arrays()
+
+        return reader.ResultReader(self._path, mmap=mmap)
 
     def export(self) -> dict:
         """ Exports experiment to a dict.
@@ -541,7 +1080,10 @@ class Experiment:
         info = {'path': self.__root_path, 'description': self.__description,
                 'num_exp': self._num_exp, 'random_state': int(self.__random_state),
                 'end_time': self._end_time, 'start_time': self._start_time, 'params': self.params,
-                'database_name': self.__database_name}
+                'database_name': self.__database_name,
+                'database_pragmas': self.__database_pragmas,
+                'metrics_buffer_size': self.__metrics_buffer_size,
+                'metrics_flush_interval': self.__metrics_flush_interval}
 
         if self.__params is not None:
             info['params'] = self.__params
@@ -549,6 +1091,13 @@ class Experiment:
         if self.__database is not None:
             info['id_database'] = self.__database_object.exp_id
 
+        if self.__profile is not None:
+            info['profile'] = self.__profile
+
+        span_times = self.span_times
+        if span_times:
+            info['spans'] = span_times
+
         return info
 
     @staticmethod
@@ -570,10 +1119,25 @@ class Experiment:
             data = json.load(infile)
             exp = Experiment(path=data['path'], num_exp=data['num_exp'], params=data['params'],
                              explanation=data['description'], database_name=data['database_name'],
+                             database_pragmas=data.get('database_pragmas', 'default'),
+                             metrics_buffer_size=data.get('metrics_buffer_size', 0),
+                             metrics_flush_interval=data.get('metrics_flush_interval', 30.0),
                              logger=logger)
 
             if 'id_database' in data:
-                db_exp = database.Experiment.get(exp_id=data['id_database'])
+                db_exp = exp.__database.get_experiment(data['id_database'])
                 exp.db_object = db_exp
+                exp.flush_metrics()  # Metrics recovered from the spill file
 
         return exp
+
+    # Method used to save every storage type
+    __SAVERS = {
+        dades.StorageType.COLOR_IMAGE: _save_data_img,
+        dades.StorageType.BINARY_IMAGE: _save_data_img,
+        dades.StorageType.STRING: _save_string,
+        dades.StorageType.OBJECT: __save_object,
+        dades.StorageType.COORDINATES_IMAGE: _save_coordinates_image,
+        dades.StorageType.COORDINATES_VALUES_IMAGE: _save_coordinates_values_images,
+        **dict.fromkeys(NUMERIC_TYPES, _save_coordinates)
+    }
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+""" Metrics buffer module.
+
+This module contains a buffer to group the metrics of an experiment before writing them to the
+database. Every metric added is also appended to a spill file, so if the process is killed the
+metrics not yet written can be recovered when the experiment is loaded again.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Callable, List, NamedTuple, Optional
+import json
+import os
+import threading
+import time
+
+
+class MetricRecord(NamedTuple):
+    name: str
+    value: object
+    theta: Optional[int]
+    step: Optional[int]
+
+
+def _to_json(value):
+    """ Converts the numpy scalars, and other unknown objects, to a JSON value. """
+    if hasattr(value, 'item'):
+        return value.item()
+
+    return str(value)
+
+
+class MetricBuffer:
+    """ Buffer of metrics.
+
+    The buffer is flushed when it contains a number of records or when some time has passed since
+    the last flush.
+
+    Args:
+        flush_func: Function that writes a list of MetricRecord.
+        size (int): Number of records that triggers the flush.
+        interval (float): Seconds since the last flush that trigger it.
+        spill_path (str): Path of the spill file. If None no spill file is used.
+    """
+
+    def __init__(self, flush_func: Callable[[List[MetricRecord]], None], size: int = 256,
+                 interval: float = 30.0, spill_path: str = None):
+        self.__flush_func = flush_func
+        self.__size = size
+        self.__interval = interval
+        self.__spill_path = spill_path
+        self.__spill = None
+        self.__spilled = 0
+        self.__lock = threading.RLock()
+        self.__records: List[MetricRecord] = []
+        self.__last_flush = time.monotonic()
+
+        if spill_path is not None and os.path.isfile(spill_path):
+            self.__recover()
+
+    def __len__(self):
+        return len(self.__records)
+
+    def __recover(self) -> None:
+        """ Reads the records of the spill file not flushed on a previous execution. """
+        records = []
+        flushed = 0
+        with open(self.__spill_path, "r") as spill:
+            for line in spill:
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # Line partially written when the process was killed
+                    continue
+
+                if 'flushed' in entry:
+                    flushed = entry['flushed']
+                else:
+                    records.append(MetricRecord(**entry))
+
+        self.__spilled = len(records)
+        self.__records = records[flushed:]
+
+    def add(self, metrics: dict, theta: int = None, step: int = None) -> None:
+        """ Adds a set of metrics to the buffer.
+
+        Args:
+            metrics: Dictionary containing the metrics in a {metric_name => metric_value}.
+            theta: (optional) Integer indicating the theta value of the experiment.
+            step: (optional) Integer with the step of the metrics.
+        """
+        records = [MetricRecord(name, value, theta, step) for name, value in metrics.items()]
+
+        with self.__lock:
+            if self.__spill_path is not None:
+                spill = self.__open_spill()
+                for record in records:
+                    spill.write(json.dumps(record._asdict(), default=_to_json) + "\n")
+                spill.flush()
+                self.__spilled += len(records)
+
+            self.__records += records
+
+    def due(self) -> bool:
+        """ Checks if the buffer should be flushed. """
+        return len(self.__records) >= self.__size or \
+            (len(self.__records) > 0 and time.monotonic() - self.__last_flush >= self.__interval)
+
+    def flush(self) -> None:
+        """ Writes all the records of the buffer.
+
+        If the writing fails the records are kept on the buffer.
+        """
+        with self.__lock:
+            if len(self.__records) > 0:
+                self.__flush_func(list(self.__records))
+                self.__records = []
+
+                if self.__spill_path is not None:
+                    spill = self.__open_spill()
+                    spill.write(json.dumps({'flushed': self.__spilled}) + "\n")
+                    spill.flush()
+
+            self.__last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """ Flushes the buffer and closes the spill file. """
+        with self.__lock:
+            self.flush()
+
+            if self.__spill is not None:
+                self.__spill.close()
+                self.__spill = None
+
+    def __open_spill(self):
+        if self.__spill is None:
+            os.makedirs(os.path.dirname(self.__spill_path), exist_ok=True)
+            self.__spill = open(self.__spill_path, "a+")
+
+            # Ends the line partially written when the process was killed
+            if self.__spill.tell() > 0:
+                self.__spill.seek(self.__spill.tell() - 1)
+                if self.__spill.read(1) != "\n":
+                    self.__spill.write("\n")
+
+        return self.__spill
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+""" Results reader module.
+
+This module contains a reader of the results saved by an experiment. The folder of the experiment is
+indexed once, and the results are only loaded when accessed. The numpy files, and the shards of the
+binary array series, are memory-mapped, so iterating over a large number of results does not load
+all of them into memory. The results packed with archive.ArchiveWriter are read from the packs.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Dict, Iterator, List, Tuple
+import fnmatch
+import io
+import os
+
+import numpy as np
+
+from ..data import dades
+from . import archive, arrays, serialization
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff", ".bmp")
+
+# Files of the experiment itself, not results
+_EXPERIMENT_FILES = ("experiment.json", "experiment_resume.txt", "metrics_buffer.jsonl",
+                     "profile.pstats", "profile_samples.txt", "resources.csv")
+
+
+def _natural_key(name: str):
+    stem, extension = os.path.splitext(name)
+    return (0, int(stem), "", extension) if stem.isdigit() else (1, 0, stem, extension)
+
+
+class ResultReader:
+    """ Reader of the results of an experiment.
+
+    The results are identified by the path of the data used to save them and the name of the file
+    where they are saved, for example "0.png", or by the name of the data for the binary array
+    series. A result can also be accessed by the name of its file without the extension, if no other
+    result of the path has the same one.
+
+    Args:
+        path (str): Folder of the experiment (exp_N).
+        mmap (bool): If True the numpy arrays are memory-mapped instead of loaded.
+    """
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.__path = path
+        self.__mmap = mmap
+        self.__index: Dict[str, Dict[str, tuple]] = {}
+        self.__aliases: Dict[str, Dict[str, str]] = {}  # Names without extension of every path
+        self.__shards: Dict[str, np.ndarray] = {}
+        self.__archive = None
+
+        self.__build_index()
+
+    def __build_index(self) -> None:
+        for folder, dirs, files in os.walk(self.__path):
+            dirs.sort()
+            data_path = os.path.relpath(folder, self.__path).replace(os.sep, "/")
+            if data_path == ".":
+                data_path = ""
+            entries = {}
+
+            is_series = arrays.INDEX_FILE in files
+            if is_series:
+                for entry in arrays.read_index(folder):
+                    entries[entry['name']] = ("array", folder, entry)
+
+            for file_name in files:
+                if data_path == "" and (file_name in _EXPERIMENT_FILES or
+                                        fnmatch.fnmatch(file_name, archive.PACK_PATTERN)):
+                    continue
+                if file_name.endswith(serialization.BUFFERS_SUFFIX):
+                    continue
+                if file_name.startswith(".") or (is_series and (
+                        file_name == arrays.INDEX_FILE or file_name.startswith("chunk_"))):
+                    continue
+
+                extension = os.path.splitext(file_name)[1]
+                entries[file_name] = ("file", os.path.join(folder, file_name), extension.lower())
+
+            if entries:
+                self.__index[data_path] = entries
+
+        packed = archive.ArchiveReader(self.__path)
+        if len(packed) > 0:
+            self.__archive = packed
+            for data_path, file_name in packed:
+                if file_name.endswith(serialization.BUFFERS_SUFFIX):
+                    continue
+                extension = os.path.splitext(file_name)[1]
+                self.__index.setdefault(data_path, {})[file_name] = ("packed", file_name,
+                                                                     extension.lower())
+
+        self.__index = {data_path: {name: entries[name]
+                                    for name in sorted(entries, key=_natural_key)}
+                        for data_path, entries in self.__index.items()}
+
+        for data_path, entries in self.__index.items():
+            stems = {}
+            for name in entries:
+                stem = os.path.splitext(name)[0]
+                stems[stem] = None if stem in stems else name
+            self.__aliases[data_path] = {stem: name for stem, name in stems.items()
+                                         if name is not None and stem not in entries}
+
+    def __resolve(self, path: str, name: str) -> str:
+        """ Name of the index of a result, accessed by its name or its name without extension. """
+        if name in self.__index.get(path, {}):
+            return name
+
+        return self.__aliases.get(path, {}).get(name, name)
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def paths(self) -> List[str]:
+        """ Paths of the data with results. """
+        return list(self.__index.keys())
+
+    def names(self, path: str) -> List[str]:
+        """ Names of the results of a path. """
+        return list(self.__index.get(path, {}).keys())
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.__index.values())
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for path, entries in self.__index.items():
+            for name in entries:
+                yield path, name
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        path, name = key
+        return self.__resolve(path, name) in self.__index.get(path, {})
+
+    def __getitem__(self, key: Tuple[str, str]):
+        path, name = key
+        return self.get(path, name)
+
+    def get(self, path: str, name: str):
+        """ Loads a result.
+
+        Args:
+            path (str): Path of the data.
+            name (str): Name of the file of the result, with or without extension, or name of the
+                        data for the binary array series.
+
+        Returns:
+            The result: numpy array for images and numeric results, string for texts and the
+            object for pickles. The results of custom storage types are loaded with their plugin.
+
+        Raises:
+            KeyError if there is no result with the path and name.
+        """
+        entry = self.__index[path][self.__resolve(path, name)]
+
+        if entry[0] == "array":
+            _, folder, info = entry
+            return self.__shard(folder, info['file'])[info['start']:info['stop']]
+        if entry[0] == "packed":
+            return self.__load_packed(path, entry[1], entry[2])
+
+        return self.__load_file(entry[1], entry[2])
+
+    def items(self, path: str) -> Iterator[Tuple[str, object]]:
+        """ Iterates over the results of a path, loading them one by one.
+
+        Args:
+            path (str): Path of the data.
+
+        Returns:
+            Iterator of tuples (name, result).
+        """
+        for name in self.names(path):
+            yield name, self.get(path, name)
+
+    def __shard(self, folder: str, file_name: str) -> np.ndarray:
+        key = os.path.join(folder, file_name)
+        if key not in self.__shards:
+            self.__shards[key] = arrays.load_shard(folder, file_name, self.__mmap)
+
+        return self.__shards[key]
+
+    def __load_file(self, file_path: str, extension: str):
+        if extension == ".npy":
+            return np.load(file_path, mmap_mode='r' if self.__mmap else None)
+        if extension in IMAGE_EXTENSIONS:
+            import cv2
+
+            return cv2.imread(file_path, cv2.IMREAD_UNCHANGED)
+        if extension == ".csv":
+            return np.loadtxt(file_path, delimiter=",")
+        if extension == ".pickle":
+            return serialization.load_path(file_path, use_mmap=self.__mmap)
+
+        plugin = dades.plugin_for_extension(extension)
+        if plugin is not None and plugin.load is not None:
+            with open(file_path, "rb") as handle:
+                return plugin.load(handle)
+
+        with open(file_path, "r") as text_file:
+            return text_file.read()
+
+    def __load_packed(self, path: str, file_name: str, extension: str):
+        content = self.__archive.read(path, file_name)
+
+        if extension == ".pickle":
+            buffers_name = file_name + serialization.BUFFERS_SUFFIX
+            buffers_content = None
+            if (path, buffers_name) in self.__archive:
+                buffers_content = self.__archive.read(path, buffers_name)
+            return serialization.loads(content, buffers_content)
+
+        return self.__load_bytes(content, extension)
+
+    @staticmethod
+    def __load_bytes(content: bytes, extension: str):
+        if extension == ".npy":
+            return np.load(io.BytesIO(content))
+        if extension in IMAGE_EXTENSIONS:
+            import cv2
+
+            return cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if extension == ".csv":
+            return np.loadtxt(io.BytesIO(content), delimiter=",")
+
+        plugin = dades.plugin_for_extension(extension)
+        if plugin is not None and plugin.load is not None:
+            return plugin.load(io.BytesIO(content))
+
+        return content.decode("utf-8")
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+""" Object serialization module.
+
+This module contains the pickling of the objects saved by an experiment. The objects are pickled
+with the highest protocol available and, optionally:
+    - The large buffers (numpy arrays, ...) are written out-of-band, without copying them into the
+      pickle stream, to a sidecar file (name.pickle.buffers). When loaded the sidecar file is
+      memory-mapped, and the arrays are views of it. Needs the protocol 5 (Python 3.8).
+    - The pickle stream is compressed with zstd or lz4, if installed, or gzip.
+
+The compression of the pickle files is detected when loaded, so the loader reads any of them.
+
+Format of the sidecar file: BUFFERS_MAGIC and, for every buffer, its length (uint64) and its
+content, aligned to BUFFERS_ALIGNMENT bytes.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import BinaryIO, List, Optional
+import gzip
+import io
+import mmap
+import os
+import pickle
+import struct
+import warnings
+
+PROTOCOL = pickle.HIGHEST_PROTOCOL
+OUT_OF_BAND = PROTOCOL >= 5  # Out-of-band buffers are available
+CODECS = ("zstd", "lz4", "gzip")
+BUFFERS_SUFFIX = ".buffers"
+BUFFERS_MAGIC = b"MMNBUFS1"
+BUFFERS_ALIGNMENT = 64
+
+_LENGTH = struct.Struct("<Q")
+_CODEC_MAGICS = {
+    b"\x28\xb5\x2f\xfd": "zstd",
+    b"\x04\x22\x4d\x18": "lz4",
+    b"\x1f\x8b": "gzip"
+}
+
+
+def _codec_installed(codec: str) -> bool:
+    try:
+        if codec == "zstd":
+            import zstandard  # noqa: F401
+        elif codec == "lz4":
+            import lz4.frame  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def resolve_codec(codec: Optional[str]) -> Optional[str]:
+    """ Gets the codec used to compress the pickles.
+
+    Args:
+        codec (str): None, for no compression, "auto", for the best codec installed, or one of
+                     CODECS. If the codec is not installed gzip is used.
+
+    Returns:
+        Codec available or None.
+
+    Raises:
+        ValueError if the codec is unknown.
+    """
+    if codec is None:
+        return None
+    if codec == "auto":
+        return next(c for c in CODECS if _codec_installed(c))
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression {codec}.")
+
+    if not _codec_installed(codec):
+        warnings.warn(f"Compression {codec} is not installed, gzip used instead.")
+        codec = "gzip"
+
+    return codec
+
+
+def _compressed_writer(handle: BinaryIO, codec: str):
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().stream_writer(handle, closefd=False)
+    if codec == "lz4":
+        import lz4.frame
+
+        return lz4.frame.LZ4FrameFile(handle, mode="wb")
+
+    return gzip.GzipFile(fileobj=handle, mode="wb")
+
+
+def _decompressed_reader(handle: BinaryIO, codec: str):
+    if codec == "zstd":
+        import zstandard
+
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(handle))
+    if codec == "lz4":
+        import lz4.frame
+
+        return lz4.frame.LZ4FrameFile(handle, mode="rb")
+
+    return gzip.GzipFile(fileobj=handle, mode="rb")
+
+
+def dump(obj, handle: BinaryIO, compression: str = None,
+         buffers: List['pickle.PickleBuffer'] = None) -> None:
+    """ Pickles an object.
+
+    Args:
+        obj: Object to pickle.
+        handle (BinaryIO): File where the pickle is written.
+        compression (str): Codec used to compress the pickle stream, None for no compression.
+        buffers (list): If not None, the buffers of the object are not pickled and appended to the
+                        list instead, to be written with write_buffers.
+
+    Raises:
+        ValueError if buffers are requested and the out-of-band buffers are not available.
+    """
+    options = {}
+    if buffers is not None:
+        if not OUT_OF_BAND:
+            raise ValueError("The out-of-band buffers need the pickle protocol 5 (Python 3.8).")
+        options['buffer_callback'] = buffers.append
+
+    if compression is None:
+        pickle.dump(obj, handle, protocol=PROTOCOL, **options)
+        return
+
+    with _compressed_writer(handle, compression) as stream:
+        pickle.dump(obj, stream, protocol=PROTOCOL, **options)
+
+
+def write_buffers(handle: BinaryIO, buffers: List['pickle.PickleBuffer']) -> None:
+    """ Writes the out-of-band buffers of a pickle, without copying them.
+
+    Args:
+        handle (BinaryIO): File where the buffers are written.
+        buffers (list): Buffers obtained with dump.
+    """
+    handle.write(BUFFERS_MAGIC)
+    position = len(BUFFERS_MAGIC)
+
+    for buffer in buffers:
+        raw = buffer.raw()
+        header = _LENGTH.pack(raw.nbytes)
+        padding = -(position + len(header)) % BUFFERS_ALIGNMENT
+
+        handle.write(header + b"\0" * padding)
+        handle.write(raw)
+        position += len(header) + padding + raw.nbytes
+
+
+def read_buffers(content) -> List[memoryview]:
+    """ Reads the out-of-band buffers of a pickle.
+
+    Args:
+        content (bytes-like): Content of the sidecar file, bytes or a memory map.
+
+    Returns:
+        List of views of the content, one for every buffer.
+
+    Raises:
+        ValueError if the content is not a sidecar file.
+    """
+    view = memoryview(content)
+    if bytes(view[:len(BUFFERS_MAGIC)]) != BUFFERS_MAGIC:
+        raise ValueError("Invalid pickle buffers file.")
+
+    buffers = []
+    position = len(BUFFERS_MAGIC)
+    while position < len(view):
+        length, = _LENGTH.unpack(view[position:position + _LENGTH.size])
+        position += _LENGTH.size
+        position += -position % BUFFERS_ALIGNMENT
+
+        buffers.append(view[position:position + length])
+        position += length
+
+    return buffers
+
+
+def load(handle: BinaryIO, buffers: List[memoryview] = None):
+    """ Unpickles an object, detecting the compression of the stream.
+
+    Args:
+        handle (BinaryIO): File with the pickle, must be seekable.
+        buffers (list): Out-of-band buffers of the pickle, see read_buffers.
+
+    Returns:
+        Object unpickled.
+    """
+    start = handle.tell()
+    magic = handle.read(4)
+    handle.seek(start)
+
+    codec = next((c for m, c in _CODEC_MAGICS.items() if magic.startswith(m)), None)
+    options = {'buffers': buffers} if buffers is not None else {}
+
+    if codec is None:
+        return pickle.load(handle, **options)
+
+    with _decompressed_reader(handle, codec) as stream:
+        return pickle.load(stream, **options)
+
+
+def loads(content: bytes, buffers_content=None):
+    """ Unpickles an object from the content of its files.
+
+    Args:
+        content (bytes): Content of the pickle file.
+        buffers_content (bytes-like): Content of the sidecar file, if any.
+
+    Returns:
+        Object unpickled.
+    """
+    buffers = read_buffers(buffers_content) if buffers_content is not None else None
+
+    return load(io.BytesIO(content), buffers=buffers)
+
+
+def load_path(path: str, use_mmap: bool = True):
+    """ Unpickles an object saved on a file, with its sidecar file if exists.
+
+    Args:
+        path (str): Path of the pickle file.
+        use_mmap (bool): If True the sidecar file is memory-mapped, and the arrays of the object
+                         are read-only views of it. Otherwise the buffers are loaded.
+
+    Returns:
+        Object unpickled.
+    """
+    buffers = None
+    buffers_path = path + BUFFERS_SUFFIX
+
+    if os.path.isfile(buffers_path):
+        with open(buffers_path, "rb") as buffers_file:
+            if use_mmap:
+                content = mmap.mmap(buffers_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                content = buffers_file.read()
+        buffers = read_buffers(content)
+
+    with open(path, "rb") as handle:
+        return load(handle, buffers=buffers)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+""" Timing spans module.
+
+This module contains a recorder of the time spent on the phases (spans) of an experiment. The spans
+can be nested, every span is identified by its path: the names of the spans containing it and its
+own name, joined by SEPARATOR. The times are measured with a monotonic high-resolution clock and
+aggregated by path: count, total, minimum and maximum.
+
+The spans are used as context managers or decorators:
+    with exp.span("train"):
+        with exp.span("epoch"):  # Path train/epoch
+            ...
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Dict, List
+import contextlib
+import threading
+import time
+
+SEPARATOR = "/"
+
+
+class Span(contextlib.ContextDecorator):
+    """ Span of time, recorded when exited. Not reentrant, but can be reused once exited. """
+
+    def __init__(self, recorder: 'SpanRecorder', name: str):
+        self._recorder = recorder
+        self._name = name
+        self._path = None
+        self._start = 0
+
+    def __enter__(self):
+        self._path = self._recorder._push(self._name)
+        self._start = time.perf_counter_ns()
+
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self._start
+        self._recorder._pop(self._path, elapsed)
+
+        return False
+
+    def _recreate_cm(self):
+        return Span(self._recorder, self._name)
+
+
+class SpanRecorder:
+    """ Aggregates the time of the spans by path. The spans of every thread are nested apart. """
+
+    def __init__(self):
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__stats: Dict[str, List[int]] = {}
+
+    def span(self, name: str) -> Span:
+        """ Creates a span, nested into the span open on the thread, if any.
+
+        Args:
+            name (str): Name of the span.
+
+        Returns:
+            Span, to use as a context manager or a decorator.
+        """
+        return Span(self, name)
+
+    def _push(self, name: str) -> str:
+        stack = getattr(self.__local, "stack", None)
+        if stack is None:
+            stack = self.__local.stack = []
+
+        path = stack[-1] + SEPARATOR + name if stack else name
+        stack.append(path)
+
+        return path
+
+    def _pop(self, path: str, elapsed: int) -> None:
+        self.__local.stack.pop()
+
+        with self.__lock:
+            stats = self.__stats.get(path)
+            if stats is None:
+                self.__stats[path] = [1, elapsed, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = min(stats[2], elapsed)
+                stats[3] = max(stats[3], elapsed)
+
+    def summary(self) -> Dict[str, dict]:
+        """ Aggregated times, in seconds, of every span path.
+
+        Returns:
+            Dictionary {path => {count, total, min, max, mean}}, sorted by path, so the spans are
+            after the ones containing them.
+        """
+        with self.__lock:
+            stats = {path: list(values) for path, values in self.__stats.items()}
+
+        return {path: {'count': count, 'total': total / 1e9, 'min': minimum / 1e9,
+                       'max': maximum / 1e9, 'mean': total / count / 1e9}
+                for path, (count, total, minimum, maximum) in sorted(stats.items())}
+
+    def metrics(self) -> Dict[str, float]:
+        """ Aggregated times as metrics, {span_<path>_<statistic> => value}. """
+        return {f"span_{path}_{name}": value for path, stats in self.summary().items()
+                for name, value in stats.items()}
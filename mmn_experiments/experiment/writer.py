@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+""" Background writer module.
+
+This module contains a writer that executes the saving of the results of an experiment outside the
+thread of the caller. The writer uses a bounded number of pending tasks, when the limit is reached
+the caller is blocked until one of the tasks finishes (back-pressure).
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from concurrent import futures
+from typing import Callable, List
+import threading
+
+
+class AsyncWriter:
+    """ Executes write tasks on a pool of background threads.
+
+    The errors raised by the tasks are not lost: they are stored and raised again on the next call
+    to submit or when the writer is closed.
+
+    Args:
+        num_workers (int): Number of threads used to write.
+        queue_size (int): Maximum number of tasks pending to be written.
+    """
+
+    def __init__(self, num_workers: int = 1, queue_size: int = 64):
+        if num_workers < 1:
+            raise ValueError("The number of workers should be at least one.")
+        if queue_size < 1:
+            raise ValueError("The size of the queue should be at least one.")
+
+        self.__executor = futures.ThreadPoolExecutor(max_workers=num_workers,
+                                                     thread_name_prefix="mmn_writer")
+        self.__slots = threading.BoundedSemaphore(queue_size)
+        self.__lock = threading.Lock()
+        self.__pending = set()
+        self.__errors: List[BaseException] = []
+        self.__closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed
+
+    def submit(self, func: Callable, *args, **kwargs) -> None:
+        """ Enqueues a write task.
+
+        Blocks when the queue is full until one of the pending tasks finishes.
+
+        Args:
+            func: Function to call on the background thread.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Raises:
+            RuntimeError if the writer is already closed.
+            The first exception raised by a previous task, if any.
+        """
+        if self.__closed:
+            raise RuntimeError("ERROR: Trying to write with a closed writer.")
+        self.raise_errors()
+
+        self.__slots.acquire()
+        try:
+            future = self.__executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self.__slots.release()
+            raise
+
+        with self.__lock:
+            self.__pending.add(future)
+        future.add_done_callback(self.__on_done)
+
+    def __on_done(self, future: futures.Future) -> None:
+        with self.__lock:
+            self.__pending.discard(future)
+            if not future.cancelled() and future.exception() is not None:
+                self.__errors.append(future.exception())
+        self.__slots.release()
+
+    def raise_errors(self) -> None:
+        """ Raises the first error found by the background tasks.
+
+        The rest of errors, if any, are discarded.
+        """
+        with self.__lock:
+            errors, self.__errors = self.__errors, []
+
+        if errors:
+            raise errors[0]
+
+    def drain(self) -> None:
+        """ Waits until all the pending tasks are written.
+
+        Raises:
+            The first exception raised by the pending tasks, if any.
+        """
+        with self.__lock:
+            pending = list(self.__pending)
+        futures.wait(pending)
+
+        self.raise_errors()
+
+    def close(self) -> None:
+        """ Drains the pending tasks and stops the background threads. """
+        if self.__closed:
+            return
+
+        self.__closed = True
+        try:
+            self.drain()
+        finally:
+            self.__executor.shutdown(wait=True)
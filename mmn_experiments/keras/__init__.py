@@ -1 +1,15 @@
-from .telegramCallback import TelegramCallback
\ No newline at end of file
+_LAZY_ATTRIBUTES = {"TelegramCallback": "mmn_experiments.keras.telegramCallback",
+                    "ThroughputCallback": "mmn_experiments.keras.throughputCallback"}
+
+
+def __getattr__(name):
+    """ Loads on first access the callbacks, they depend on TensorFlow. """
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+""" Background notifier module.
+
+This module contains a notifier that sends messages from a background thread, so a slow or hanging
+request does not block the training. The messages are kept on a bounded queue, when it is full
+the new messages are dropped or the caller waits, depending on the policy.
+
+The messages are sent with a transport: any callable transport(messages, images). The default
+transport sends them with telegram_send.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Callable, List
+import queue
+import threading
+import warnings
+
+POLICIES = ("drop", "wait")
+
+_STOP = object()
+
+
+def telegram_transport(messages: List[str], images=None) -> None:
+    """ Sends the messages, and images, through the telegram bot configured with telegram_send. """
+    import telegram_send
+
+    telegram_send.send(messages=messages, images=images)
+
+
+class Notifier:
+    """ Sends messages on a background thread.
+
+    The errors of the transport are warned and do not stop the notifier.
+
+    Args:
+        transport (Callable): Function transport(messages, images) that sends the messages. By
+                              default telegram_transport.
+        queue_size (int): Maximum number of messages pending to be sent.
+        policy (str): What to do when the queue is full: "drop" the new message or "wait" until
+                      there is space on the queue.
+    """
+
+    def __init__(self, transport: Callable = None, queue_size: int = 16, policy: str = "drop"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}.")
+
+        self.__transport = transport if transport is not None else telegram_transport
+        self.__policy = policy
+        self.__queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.__dropped = 0
+        self.__closed = False
+
+        self.__thread = threading.Thread(target=self.__run, name="mmn_notifier", daemon=True)
+        self.__thread.start()
+
+    @property
+    def dropped(self) -> int:
+        """ Number of messages dropped because the queue was full. """
+        return self.__dropped
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed
+
+    def send(self, messages: List[str], images=None, wait: bool = None,
+             timeout: float = None) -> bool:
+        """ Enqueues messages to send.
+
+        Args:
+            messages (List[str]): Messages.
+            images: Images sent with the messages, or a function that returns them. The function
+                    is called on the background thread, just before sending the messages.
+            wait (bool): If True waits for space on the queue when it is full, instead of dropping
+                         the messages. By default depends on the policy of the notifier.
+            timeout (float): Maximum time, in seconds, waiting for space on the queue. If None
+                             waits until there is space.
+
+        Returns:
+            False if the messages were dropped.
+
+        Raises:
+            RuntimeError if the notifier is already closed.
+        """
+        if self.__closed:
+            raise RuntimeError("ERROR: Trying to send with a closed notifier.")
+
+        if wait is None:
+            wait = self.__policy == "wait"
+
+        try:
+            self.__queue.put((messages, images), block=wait, timeout=timeout if wait else None)
+        except queue.Full:
+            self.__dropped += 1
+            return False
+
+        return True
+
+    def close(self, timeout: float = None) -> None:
+        """ Sends the messages pending and stops the background thread.
+
+        Args:
+            timeout (float): Maximum time, in seconds, waiting for the messages pending. If None
+                             waits until all of them are sent.
+        """
+        if self.__closed:
+            return
+
+        self.__closed = True
+        try:
+            self.__queue.put(_STOP, timeout=timeout)
+        except queue.Full:  # The transport is hanging, the daemon thread is abandoned
+            return
+        self.__thread.join(timeout)
+
+    def __run(self) -> None:
+        while True:
+            item = self.__queue.get()
+            if item is _STOP:
+                return
+
+            messages, images = item
+            try:
+                if callable(images):
+                    images = images()
+                self.__transport(messages, images)
+            except Exception as error:  # The training should not stop by a notification
+                warnings.warn(f"Error sending the notification: {error}")
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+""" History plot module.
+
+This module contains the plot of the history of a training. The plot is drawn with the Agg backend,
+without pyplot, so it can be rendered on any thread and the figure is not kept by the global state
+of matplotlib. The figure and its axes are created once and updated on every render.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Dict, List, Sequence
+import threading
+
+import numpy as np
+
+
+class HistoryPlot:
+    """ Plot, with a subplot for every metric, of the train and validation values by epoch.
+
+    Args:
+        metrics (Sequence[str]): Keys of the metrics plotted. The validation values are found with
+                                 the key prefixed by "val_".
+        size (tuple): Size of the figure in inches.
+        dpi (int): Resolution of the figure.
+    """
+
+    def __init__(self, metrics: Sequence[str] = ("categorical_accuracy", "loss"),
+                 size: tuple = (6.4, 4.8), dpi: int = 100):
+        self.__metrics = tuple(metrics)
+        self.__size = size
+        self.__dpi = dpi
+        self.__lock = threading.Lock()
+
+        self.__canvas = None
+        self.__lines = None
+
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    def __build(self) -> None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=self.__size, dpi=self.__dpi)
+        self.__canvas = FigureCanvasAgg(figure)
+        self.__lines = []
+
+        for i, metric in enumerate(self.__metrics):
+            axis = figure.add_subplot(1, len(self.__metrics), i + 1)
+            train, = axis.plot([], [])
+            validation, = axis.plot([], [])
+
+            axis.title.set_text(f"Model {metric}")
+            axis.set_ylabel(metric)
+            axis.set_xlabel('epoch')
+            axis.legend(['train', 'validation'], loc='upper left')
+
+            self.__lines.append((axis, train, validation))
+
+    def render(self, history: Dict[str, List[float]]) -> np.ndarray:
+        """ Draws the history.
+
+        Args:
+            history (dict): Values of every epoch, {metric => list of values}. The metrics not
+                            found are left empty.
+
+        Returns:
+            RGB image with the plot. It is a view of the buffer of the figure, valid until the next
+            call to render.
+        """
+        with self.__lock:
+            if self.__canvas is None:
+                self.__build()
+
+            for metric, (axis, train, validation) in zip(self.__metrics, self.__lines):
+                for line, key in ((train, metric), (validation, "val_" + metric)):
+                    values = history.get(key, [])
+                    line.set_data(np.arange(len(values)), values)
+
+                axis.relim()
+                axis.autoscale_view()
+
+            self.__canvas.draw()
+
+            return np.asarray(self.__canvas.buffer_rgba())[..., :3]
@@ -1,25 +1,78 @@
 # -*- coding: utf-8 -*-
 """ Callback to send keras results to telegram bot.
 
-This module defines a keras callback to send status messages through a telegram bot.
+This module defines a keras callback to send status messages through a telegram bot. The messages
+are sent from a background thread (see notifier.Notifier), so the training is not blocked by the
+requests, and the messages of consecutive epochs can be coalesced on a single message.
 """
-from matplotlib import pyplot as plt
 from datetime import datetime
-import numpy as np
+import math
 import time
 
-import telegram_send
 from tensorflow import keras
 
+from . import notifier, plot
+
 
 class TelegramCallback(keras.callbacks.Callback):
+    """ Keras callback that notifies the progress of the training.
+
+    Args:
+        show_plot (bool): If True, a plot of the history is sent at the end of the training.
+        plot_metrics (Sequence[str]): Metrics shown on the plot, with their validation values.
+        transport (Callable): Function transport(messages, images) used to send the messages, by
+                              default notifier.telegram_transport.
+        min_interval (float): Minimum time, in seconds, between two epoch messages. The epochs
+                              skipped are summarized on the next message.
+        every_epochs (int): Number of epochs summarized on every epoch message.
+        queue_size (int): Maximum number of messages pending to be sent.
+        policy (str): What to do when the queue is full, see notifier.POLICIES.
+        close_timeout (float): Maximum time, in seconds, that the end of the training waits for the
+                               messages pending. The messages of the end of the training are not
+                               dropped when the queue is full, they wait during this time. If
+                               None waits until all of them are sent.
+    """
+
+    def __init__(self, show_plot=False, *args, plot_metrics=("categorical_accuracy", "loss"),
+                 transport=None, min_interval: float = 0.0,
+                 every_epochs: int = 1, queue_size: int = 16, policy: str = "drop",
+                 close_timeout: float = 30.0, **kwargs):
+        if policy not in notifier.POLICIES:
+            raise ValueError(f"Unknown policy {policy}.")
 
-    def __init__(self, show_plot=False, *args, **kwargs):
         self.__show_plot = show_plot
+        self.__plot = plot.HistoryPlot(plot_metrics) if show_plot else None
+        self.__history = {}
         self.__epoch_time_start = None
 
+        self.__transport = transport
+        self.__min_interval = min_interval
+        self.__every_epochs = max(every_epochs, 1)
+        self.__queue_size = queue_size
+        self.__policy = policy
+        self.__close_timeout = close_timeout
+
+        self.__notifier = None
+        self.__pending_epochs = []
+        self.__last_sent = 0.0
+
         super().__init__(*args, **kwargs)
 
+    def __send(self, messages, images=None, deadline: float = None) -> None:
+        """ Sends messages, waiting until the deadline (monotonic time) for space on the queue. """
+        if self.__notifier is None or self.__notifier.closed:
+            self.__notifier = notifier.Notifier(self.__transport, queue_size=self.__queue_size,
+                                                policy=self.__policy)
+
+        if deadline is None:
+            self.__notifier.send(messages, images)
+        else:
+            self.__notifier.send(messages, images, wait=True, timeout=self.__remaining(deadline))
+
+    @staticmethod
+    def __remaining(deadline: float):
+        return None if deadline == math.inf else max(deadline - time.monotonic(), 0)
+
     def on_train_begin(self, logs=None):
         """ Executes on the beginning of the train.
 
@@ -33,66 +86,87 @@ class TelegramCallback(keras.callbacks.Callback):
 
         messages = [f"Train started at {start_date}"]
 
-        telegram_send.send(messages=messages)
+        self.__pending_epochs = []
+        self.__history = {}
+        self.__last_sent = time.monotonic()
+        self.__send(messages)
 
     def on_train_end(self, logs=None):
         end_date = datetime.today().strftime('%d/%m/%Y %H:%M:%S')
         messages = [f"Train finished at {end_date}"]
 
-        plot = None
+        history_plot = None
         if self.__show_plot:
-            plot = TelegramCallback.__build_history_plot(logs=logs)
+            history_plot = self.__history_plot(logs)
 
-        telegram_send.send(messages=messages, images=plot)
+        deadline = math.inf if self.__close_timeout is None else \
+            time.monotonic() + self.__close_timeout
+        self.__send_epochs(deadline)
+        self.__send(messages, images=history_plot, deadline=deadline)
+        self.__notifier.close(timeout=self.__remaining(deadline))
 
-    @staticmethod
-    def __build_history_plot(logs=None):
-        """ Returns a numpy array with the plot of loss functions.
+    def __history_plot(self, logs=None):
+        """ Function that renders the plot of the history, called by the notifier thread.
+
+        The history is the one recorded on every epoch or, if there is not any, the logs when they
+        contain the list of values of every metric.
 
         Args:
             logs:
 
         Returns:
-
+            Function without arguments that returns a numpy array with the plot, None if there is
+            no history.
         """
+        history = self.__history
+        if not history and logs is not None:
+            history = {key: value for key, value in logs.items() if isinstance(value, list)}
+        if not history:
+            return None
 
-        data = None
-        if logs is not None:
-            # Make a random plot...
-            fig = plt.figure()
-            ax1 = fig.add_subplot(121)
-            ax2 = fig.add_subplot(122)
+        history = {key: list(values) for key, values in history.items()}
 
-            ax1.plot(logs['categorical_accuracy'])
-            ax1.plot(logs['val_categorical_accuracy'])
-            ax1.title.set_text('Model accuracy')
-            ax1.set_ylabel('accuracy')
-            ax1.set_xlabel('epoch')
-            ax1.legend(['train', 'validation'], loc='upper left')
-
-            # "Loss"
-            ax2.plot(logs['loss'])
-            ax2.plot(logs['val_loss'])
-            ax2.title.set_text('Model loss')
-            ax2.set_ylabel('loss')
-            ax2.set_xlabel('epoch')
-            ax2.legend(['train', 'validation'], loc='upper left')
-
-            fig.canvas.draw()
-
-            data = np.fromstring(fig.canvas.tostring_rgb(), dtype=np.uint8, sep='')
-            data = data.reshape(fig.canvas.get_width_height()[::-1] + (3,))
-
-        return data
+        return lambda: self.__plot.render(history)
 
     def on_epoch_begin(self, batch, logs=None):
         self.__epoch_time_start = time.time()
 
     def on_epoch_end(self, epoch, logs=None):
         duration = time.time() - self.__epoch_time_start
-        duration = round(duration, 2)
+        self.__pending_epochs.append((epoch, logs['loss'], duration))
 
-        messages = [f"The average loss for epoch {epoch} is {logs['loss']} \n "
-                    f"the training of the epoch has last {duration} seconds"]
+        if self.__show_plot:
+            for metric in self.__plot.metrics:
+                for key in (metric, "val_" + metric):
+                    if key in logs:
+                        self.__history.setdefault(key, []).append(float(logs[key]))
 
-        telegram_send.send(messages=messages)
+        if len(self.__pending_epochs) >= self.__every_epochs and \
+                time.monotonic() - self.__last_sent >= self.__min_interval:
+            self.__send_epochs()
+
+    def __send_epochs(self, deadline: float = None) -> None:
+        """ Sends a message with the epochs pending, a summary if there are more than one.
+
+        Args:
+            deadline (float): Monotonic time until the message waits for space on the queue. If
+                              None the policy of the notifier is used.
+        """
+        epochs, self.__pending_epochs = self.__pending_epochs, []
+        if not epochs:
+            return
+
+        if len(epochs) == 1:
+            epoch, loss, duration = epochs[0]
+            message = f"The average loss for epoch {epoch} is {loss} \n " \
+                      f"the training of the epoch has last {round(duration, 2)} seconds"
+        else:
+            first, last = epochs[0][0], epochs[-1][0]
+            losses = [loss for _, loss, _ in epochs]
+            duration = sum(duration for _, _, duration in epochs)
+            message = f"The average loss for epochs {first} to {last} is " \
+                      f"{sum(losses) / len(losses)}, the loss of the last epoch is {losses[-1]} " \
+                      f"\n the training of the epochs has last {round(duration, 2)} seconds"
+
+        self.__last_sent = time.monotonic()
+        self.__send([message], deadline=deadline)
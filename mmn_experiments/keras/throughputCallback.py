@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+""" Callback to measure the throughput of the training.
+
+This module defines a keras callback that measures the time of every training batch and saves, at
+the end of every epoch, a summary as metrics of an experiment. The time of every batch is split in:
+    - Data wait: time between the end of the previous batch, or the beginning of the epoch, and the
+      beginning of the batch, mostly spent getting the data.
+    - Compute: time between the beginning and the end of the batch.
+
+The times are kept on preallocated ring buffers and only aggregated at the end of the epoch, so the
+overhead on every batch is minimal.
+"""
+from typing import Sequence
+import time
+
+import numpy as np
+from tensorflow import keras
+
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """ Keras callback that saves the throughput of every epoch on an experiment.
+
+    Metrics saved (times in milliseconds), with the prefix:
+        batch_time_pX: Percentiles of the time of the batches (data wait and compute).
+        compute_time_mean, data_wait_mean: Mean of the times of the batches.
+        data_wait_fraction: Fraction of the time of the batches spent waiting for the data.
+        batches_per_sec, samples_per_sec: Throughput of the epoch, the second one only if the
+                                          batch size is known.
+
+    Args:
+        experiment (Experiment): Experiment where the metrics are saved with add_metrics.
+        batch_size (int): Number of samples of every batch. If None it is read from the parameters
+                          of the training, if possible.
+        capacity (int): Number of batches kept to compute the percentiles, the last ones of the
+                        epoch.
+        percentiles (Sequence[int]): Percentiles of the time of the batches.
+        prefix (str): Prefix of the names of the metrics.
+        theta (int): Theta value passed to add_metrics.
+    """
+
+    def __init__(self, experiment, batch_size: int = None, capacity: int = 4096,
+                 percentiles: Sequence[int] = (50, 95, 99), prefix: str = "train_",
+                 theta: int = None, *args, **kwargs):
+        self.__experiment = experiment
+        self.__batch_size = batch_size
+        self.__capacity = max(capacity, 1)
+        self.__percentiles = tuple(percentiles)
+        self.__prefix = prefix
+        self.__theta = theta
+
+        self.__compute_ns = np.zeros(self.__capacity, dtype=np.int64)
+        self.__wait_ns = np.zeros(self.__capacity, dtype=np.int64)
+        self.__count = 0
+        self.__batch_start = 0
+        self.__epoch_start = 0
+        self.__last_end = 0
+
+        super().__init__(*args, **kwargs)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.__count = 0
+        self.__epoch_start = time.perf_counter_ns()
+        self.__last_end = self.__epoch_start
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.__batch_start = time.perf_counter_ns()
+        self.__wait_ns[self.__count % self.__capacity] = self.__batch_start - self.__last_end
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.__last_end = time.perf_counter_ns()
+
+        self.__compute_ns[self.__count % self.__capacity] = self.__last_end - self.__batch_start
+        self.__count += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.__count == 0:
+            return
+
+        elapsed = (time.perf_counter_ns() - self.__epoch_start) / 1e9
+        size = min(self.__count, self.__capacity)
+        compute = self.__compute_ns[:size] / 1e6
+        wait = self.__wait_ns[:size] / 1e6
+        batch_time = compute + wait
+
+        metrics = {f"batch_time_p{p}": float(value)
+                   for p, value in zip(self.__percentiles,
+                                       np.percentile(batch_time, self.__percentiles))}
+        metrics["compute_time_mean"] = float(compute.mean())
+        metrics["data_wait_mean"] = float(wait.mean())
+        metrics["data_wait_fraction"] = float(wait.sum() / max(batch_time.sum(), 1e-12))
+        metrics["batches_per_sec"] = self.__count / elapsed
+
+        batch_size = self.__batch_size
+        if batch_size is None and getattr(self, "params", None):
+            batch_size = self.params.get("batch_size")
+        if batch_size is not None:
+            metrics["samples_per_sec"] = self.__count * batch_size / elapsed
+
+        metrics = {self.__prefix + name: value for name, value in metrics.items()}
+        self.__experiment.add_metrics(metrics, theta=self.__theta, step=epoch)
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+""" Module containing the profilers used by the experiment decorator.
+
+Every profiler is started before the function of the experiment and stopped after it. When stopped,
+the profiler writes its detailed output on the folder of the experiment and returns a summary,
+saved on experiment.json, and a set of numeric metrics, saved on the database.
+
+Profilers:
+    cprofile: Deterministic profile with cProfile. Output: profile.pstats.
+    sampling: Samples the stack of the thread of the experiment at a fixed interval. Output:
+              profile_samples.txt, with the collapsed stacks (flame graph format).
+    memory: Peak and top allocations with tracemalloc.
+    resources: CPU usage and resident memory sampled from a background thread. Output:
+               resources.csv.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from typing import Dict, Tuple
+import abc
+import collections
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+TOP = 10
+
+
+class Profiler(abc.ABC):
+    """ Base class of the profilers. """
+
+    @abc.abstractmethod
+    def start(self) -> None:
+        """ Starts the profiler. """
+
+    @abc.abstractmethod
+    def stop(self, path: str) -> Tuple[dict, Dict[str, float]]:
+        """ Stops the profiler.
+
+        Args:
+            path (str): Folder of the experiment, where the output files are written. If None the
+                        files are not written.
+
+        Returns:
+            Tuple with the summary and the metrics.
+        """
+
+
+class CProfiler(Profiler):
+    """ Deterministic profiler. """
+
+    def __init__(self, top: int = TOP):
+        self.__top = top
+        self.__profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.__profile.enable()
+
+    def stop(self, path: str) -> Tuple[dict, Dict[str, float]]:
+        self.__profile.disable()
+        if path is not None:
+            self.__profile.dump_stats(os.path.join(path, "profile.pstats"))
+
+        stats = pstats.Stats(self.__profile, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+
+        top = [{'function': pstats.func_std_string(func), 'calls': calls,
+                'tottime': tottime, 'cumtime': cumtime}
+               for func, (_, calls, tottime, cumtime, _) in rows[:self.__top]]
+        summary = {'total_calls': stats.total_calls, 'total_time': stats.total_tt, 'top': top}
+
+        return summary, {'profile_total_time': stats.total_tt,
+                         'profile_total_calls': stats.total_calls}
+
+
+class SamplingProfiler(Profiler):
+    """ Statistical profiler of the thread that starts it.
+
+    Args:
+        interval (float): Time, in seconds, between two samples.
+        top (int): Number of functions of the summary.
+    """
+
+    def __init__(self, interval: float = 0.01, top: int = TOP):
+        self.__interval = interval
+        self.__top = top
+        self.__stacks = collections.Counter()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__target = None
+
+    def start(self) -> None:
+        self.__target = threading.get_ident()
+        self.__thread = threading.Thread(target=self.__run, name="mmn_sampler", daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        while not self.__stop.wait(self.__interval):
+            frame = sys._current_frames().get(self.__target)
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                             f"{code.co_firstlineno})")
+                frame = frame.f_back
+
+            if stack:
+                self.__stacks[";".join(reversed(stack))] += 1
+
+    def stop(self, path: str) -> Tuple[dict, Dict[str, float]]:
+        self.__stop.set()
+        self.__thread.join()
+
+        if path is not None:
+            with open(os.path.join(path, "profile_samples.txt"), "w") as samples_file:
+                for stack, count in self.__stacks.most_common():
+                    samples_file.write(f"{stack} {count}\n")
+
+        total = sum(self.__stacks.values())
+        leaves = collections.Counter()
+        for stack, count in self.__stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+
+        top = [{'function': function, 'samples': count, 'fraction': count / max(total, 1)}
+               for function, count in leaves.most_common(self.__top)]
+        summary = {'interval': self.__interval, 'samples': total, 'top': top}
+
+        return summary, {'profile_samples': total}
+
+
+class MemoryProfiler(Profiler):
+    """ Peak memory and top allocations with tracemalloc.
+
+    If tracemalloc is already tracing when started, the tracing of the caller is not modified: it is
+    not stopped, and the peak is the one since the caller started it.
+
+    Args:
+        top (int): Number of allocations of the summary.
+        frames (int): Number of frames stored of every allocation.
+    """
+
+    def __init__(self, top: int = TOP, frames: int = 1):
+        self.__top = top
+        self.__frames = frames
+        self.__started = False
+
+    def start(self) -> None:
+        self.__started = not tracemalloc.is_tracing()
+        if self.__started:
+            tracemalloc.start(self.__frames)
+
+    def stop(self, path: str) -> Tuple[dict, Dict[str, float]]:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if self.__started:
+            tracemalloc.stop()
+
+        top = [{'location': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+               for stat in snapshot.statistics("lineno")[:self.__top]]
+        summary = {'peak': peak, 'current': current, 'top': top}
+
+        return summary, {'memory_peak_mb': peak / 2 ** 20, 'memory_current_mb': current / 2 ** 20}
+
+
+def _rss() -> int:
+    """ Resident memory of the process, in bytes. """
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    import resource
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class ResourceSampler(Profiler):
+    """ Samples the CPU usage and the resident memory of the process.
+
+    Args:
+        interval (float): Time, in seconds, between two samples.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.__interval = interval
+        self.__samples = []
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(target=self.__run, name="mmn_resources", daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        start = last_wall = time.perf_counter()
+        last_cpu = time.process_time()
+
+        stopped = False
+        while not stopped:  # The last sample is taken when stopped
+            stopped = self.__stop.wait(self.__interval)
+
+            wall, cpu = time.perf_counter(), time.process_time()
+            cpu_percent = 100 * (cpu - last_cpu) / max(wall - last_wall, 1e-9)
+            self.__samples.append((wall - start, cpu_percent, _rss()))
+            last_wall, last_cpu = wall, cpu
+
+    def stop(self, path: str) -> Tuple[dict, Dict[str, float]]:
+        self.__stop.set()
+        self.__thread.join()
+
+        if path is not None:
+            with open(os.path.join(path, "resources.csv"), "w") as resources_file:
+                resources_file.write("time,cpu_percent,rss\n")
+                for sample in self.__samples:
+                    resources_file.write("{:.3f},{:.1f},{}\n".format(*sample))
+
+        if not self.__samples:
+            return {'interval': self.__interval, 'samples': 0}, {}
+
+        cpu = [sample[1] for sample in self.__samples]
+        rss = [sample[2] for sample in self.__samples]
+        metrics = {'cpu_percent_mean': sum(cpu) / len(cpu), 'cpu_percent_max': max(cpu),
+                   'rss_mean_mb': sum(rss) / len(rss) / 2 ** 20, 'rss_max_mb': max(rss) / 2 ** 20}
+
+        return {'interval': self.__interval, 'samples': len(self.__samples), **metrics}, metrics
+
+
+PROFILERS = {'cprofile': CProfiler, 'sampling': SamplingProfiler, 'memory': MemoryProfiler,
+             'resources': ResourceSampler}
+
+
+def create_profilers(modes, options: Dict[str, dict] = None) -> Dict[str, Profiler]:
+    """ Creates the profilers.
+
+    Args:
+        modes (str | Iterable[str]): Names of the profilers, see PROFILERS.
+        options (dict): Arguments of the profilers, {mode => {argument => value}}.
+
+    Returns:
+        Dictionary {mode => profiler}.
+
+    Raises:
+        ValueError if a mode is not known.
+    """
+    if isinstance(modes, str):
+        modes = (modes,)
+    options = options or {}
+
+    profilers = {}
+    for mode in modes:
+        if mode not in PROFILERS:
+            raise ValueError(f"Unknown profiling mode {mode}.")
+        profilers[mode] = PROFILERS[mode](**options.get(mode, {}))
+
+    return profilers
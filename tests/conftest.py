@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+""" Fixtures shared by the tests.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import logging
+
+import pytest
+
+from mmn_experiments.experiment import experiment
+
+
+@pytest.fixture
+def make_experiment(tmp_path):
+    """ Factory of started experiments saved on a temporary folder. """
+    experiments = []
+
+    def make(**kwargs):
+        exp = experiment.Experiment(str(tmp_path), explanation="test",
+                                    logger=logging.getLogger("tests"), **kwargs)
+        exp.init()
+        experiments.append(exp)
+
+        return exp
+
+    yield make
+
+    for exp in experiments:
+        if exp.end_time == 0:
+            exp.finish()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+""" Tests and benchmark of the binary array storage of the numeric results.
+
+The arrays appended on every step must be read back, memory-mapped, as saved. The time and size of
+the binary storages are compared with the CSV files.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from mmn_experiments.data import dades
+from mmn_experiments.experiment import arrays
+
+STEPS = 200
+POINTS = 500
+
+
+def _coordinates(step: int) -> np.ndarray:
+    return np.random.default_rng(step).uniform(0, 1000, size=(POINTS, 2))
+
+
+def _folder_size(folder: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, file_name))
+               for root, _, files in os.walk(folder) for file_name in files)
+
+
+@pytest.mark.parametrize("array_storage", ["csv", "npy", "npz"])
+def test_append_by_step(make_experiment, array_storage):
+    exp = make_experiment(array_storage=array_storage, array_chunk_size=32)
+
+    start = time.perf_counter()
+    for step in range(STEPS):
+        exp.save_result(dades.Data(_coordinates(step), "coordinates",
+                                   tipus=dades.StorageType.COORDINATES))
+    exp.flush_arrays()
+    elapsed = time.perf_counter() - start
+
+    size = _folder_size(os.path.join(exp.path, "coordinates"))
+    print(f"{array_storage}: {elapsed / STEPS * 1e3:.3f} ms/step, {size / 1024:.1f} KiB")
+
+    reader = exp.reader(mmap=True)
+    names = reader.names("coordinates")
+    assert len(names) == STEPS
+    for step, name in enumerate(names):
+        loaded = reader.get("coordinates", name)
+        if array_storage == "csv":
+            np.testing.assert_allclose(loaded, _coordinates(step))
+        else:
+            assert np.array_equal(loaded, _coordinates(step))
+    if array_storage == "npy":
+        assert isinstance(loaded, np.memmap)
+
+
+def test_appended_array_copied(tmp_path):
+    store = arrays.ArrayStore(str(tmp_path))
+    buffer = np.zeros((4, 2))
+
+    for value in range(3):
+        buffer[:] = value
+        store.append("series", buffer)
+    store.close()
+
+    for value in range(3):
+        assert (arrays.read_array(str(tmp_path / "series"), str(value)) == value).all()
+
+
+@pytest.mark.parametrize("num_workers", [1, 4])
+def test_batches_named_by_the_store(make_experiment, num_workers):
+    exp = make_experiment(array_storage="npy")
+    storage_type = dades.StorageType.COORDINATES
+
+    exp.save_result(dades.DataBatch(np.zeros((3, 4, 2)), "points", tipus=storage_type),
+                    num_workers=num_workers)
+    exp.save_result(dades.Data(np.ones((4, 2)), "points", tipus=storage_type))
+    exp.save_result(dades.DataBatch(np.full((3, 4, 2), 2.0), "points", tipus=storage_type),
+                    num_workers=num_workers)
+    exp.finish()
+
+    reader = exp.reader()
+    assert reader.names("points") == [str(i) for i in range(7)]
+    assert [reader.get("points", name)[0, 0] for name in reader.names("points")] == \
+        [0, 0, 0, 1, 2, 2, 2]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+""" Tests of the asynchronous saving of the results.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import os
+
+import numpy as np
+import pytest
+
+from mmn_experiments.data import dades
+from mmn_experiments.experiment import arrays
+
+
+def test_names_follow_the_calls(make_experiment):
+    exp = make_experiment(async_save=True, async_workers=4)
+
+    for i in range(64):
+        exp.save_result(dades.Data(np.full((2, 2), i), "values",
+                                   tipus=dades.StorageType.COORDINATES))
+    exp.finish()
+
+    folder = os.path.join(exp.path, "values")
+    for i in range(64):
+        assert (np.loadtxt(os.path.join(folder, f"{i}.csv"), delimiter=",") == i).all()
+
+
+def test_finish_after_failed_save(make_experiment):
+    exp = make_experiment(async_save=True, array_storage="npy")
+
+    # The error of a save is raised by the next call, the failed save is the last one
+    exp.save_result(dades.Data(np.zeros((3, 2)), "points", tipus=dades.StorageType.COORDINATES))
+    exp.save_result(dades.Data("not an image", "images", tipus=dades.StorageType.COLOR_IMAGE))
+
+    with pytest.raises(Exception):
+        exp.finish()
+
+    assert exp.end_time != 0
+    assert os.path.isfile(os.path.join(exp.path, "experiment.json"))
+    assert os.path.isfile(os.path.join(exp.path, "experiment_resume.txt"))
+    assert len(arrays.read_index(os.path.join(exp.path, "points"))) == 1
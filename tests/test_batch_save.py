@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+""" Benchmark of the saving of lists of data, sequential and on multiple workers.
+
+The files written by the workers must have the same names than the ones written sequentially, the
+index of every image on the list.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from mmn_experiments.data import dades
+
+cv2 = pytest.importorskip("cv2")
+
+IMAGES = 48
+WORKERS = 4
+
+
+def _images() -> list:
+    rng = np.random.default_rng(0)
+    images = rng.integers(0, 256, size=(IMAGES, 256, 256, 3), dtype=np.uint8)
+
+    return [dades.Data(image, "images", tipus=dades.StorageType.COLOR_IMAGE) for image in images]
+
+
+def _save(exp, datas, num_workers: int) -> float:
+    start = time.perf_counter()
+    exp.save_result(datas, num_workers=num_workers, chunk_size=4)
+
+    return time.perf_counter() - start
+
+
+def test_parallel_batch_matches_sequential(make_experiment):
+    datas = _images()
+    sequential, parallel = make_experiment(), make_experiment()
+
+    sequential_time = _save(sequential, datas, num_workers=1)
+    parallel_time = _save(parallel, datas, num_workers=WORKERS)
+    print(f"{IMAGES} images: sequential {IMAGES / sequential_time:.1f} images/s, "
+          f"{WORKERS} workers {IMAGES / parallel_time:.1f} images/s")
+
+    sequential_folder = os.path.join(sequential.path, "images")
+    parallel_folder = os.path.join(parallel.path, "images")
+    names = sorted(os.listdir(sequential_folder))
+
+    assert names == sorted(f"{i}.png" for i in range(IMAGES))
+    assert sorted(os.listdir(parallel_folder)) == names
+    for i, data in enumerate(datas):
+        for folder in (sequential_folder, parallel_folder):
+            assert np.array_equal(cv2.imread(os.path.join(folder, f"{i}.png")), data.data)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+""" Peak memory benchmark of the saving of coordinates values images.
+
+The images are drawn on three working arrays borrowed from the buffer pool of the experiment: the
+drawing (float), the gray image and the colormap output. The request asked for at most one working
+buffer, but the colormap needs the gray image as input while writing its output, so three are kept.
+Once the pool has the arrays of a shape, saving more images of the same shape must not allocate any
+full-size array, so the steady-state peak memory, measured with tracemalloc, is almost zero.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from mmn_experiments.data import dades
+
+pytest.importorskip("cv2")
+
+SHAPE = (2160, 3840)  # 4K
+POINTS = 1000
+IMAGES = 3
+STEADY_BUDGET = 1 * 2 ** 20  # Bytes, far below a full-size array
+
+
+def _data(seed: int) -> dades.Data:
+    rng = np.random.default_rng(seed)
+    image = rng.uniform(0, 1, size=SHAPE).astype(np.float32)
+    coordinates = rng.integers(0, min(SHAPE), size=(POINTS, 2))
+    values = rng.uniform(0, 1, size=POINTS)
+
+    return dades.Data((image, coordinates, values), "values",
+                      tipus=dades.StorageType.COORDINATES_VALUES_IMAGE)
+
+
+def test_steady_state_peak_memory(make_experiment):
+    exp = make_experiment()
+    datas = [_data(seed) for seed in range(IMAGES + 1)]
+
+    tracemalloc.start()
+    try:
+        exp.save_result(datas[0])
+        first_peak = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        for data in datas[1:]:
+            exp.save_result(data)
+        steady_peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+    print(f"first image {first_peak / 2 ** 20:.1f} MiB, "
+          f"next {IMAGES} images {steady_peak / 2 ** 20:.2f} MiB")
+
+    assert steady_peak < STEADY_BUDGET
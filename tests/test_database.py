@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+""" Tests of the handlers of the experiments databases.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import os
+import sqlite3
+
+import pytest
+
+from mmn_experiments.database_model import database
+
+
+def _descriptions(path: str) -> list:
+    with sqlite3.connect(path) as connection:
+        return [row[0] for row in connection.execute("SELECT description FROM experiment")]
+
+
+def test_restart_keeps_the_connection(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    handler = database.ExperimentDB()
+    handler.start(path, pragmas="wal")
+    handler.connect()
+
+    database.ExperimentDB().start(path, pragmas="wal")
+
+    assert not database.ExperimentDB._databases[os.path.abspath(path)].is_closed()
+
+
+def test_other_pragmas_raise(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    database.ExperimentDB().start(path, pragmas="wal")
+
+    with pytest.raises(ValueError):
+        database.ExperimentDB().start(path, pragmas="default")
+
+
+def test_experiments_write_to_their_database(make_experiment, tmp_path):
+    first = make_experiment(database_name="first.db")
+    second = make_experiment(database_name="second.db")
+    first.finish()
+    second.finish()
+
+    assert _descriptions(str(tmp_path / "first.db")) == ["test"]
+    assert _descriptions(str(tmp_path / "second.db")) == ["test"]
+
+
+def test_metrics_without_theta_are_unique(make_experiment, tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    for _ in range(2):
+        exp = make_experiment(database_name="db.sqlite")
+        exp.add_metrics({'accuracy': 0.5})
+        exp.add_metrics({'accuracy': 0.5})
+        exp.finish()
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM result").fetchone()[0] == 1
+        assert connection.execute("SELECT COUNT(*) FROM result_experiment_through").fetchone()[0] \
+            == 2
+        with pytest.raises(sqlite3.IntegrityError):
+            connection.execute("INSERT INTO result (name, value, theta) "
+                               "VALUES ('accuracy', '0.5', NULL)")
+
+
+def test_duplicated_metrics_without_theta_migrated(make_experiment, tmp_path):
+    exp = make_experiment(database_name="old.sqlite")
+    exp.add_metrics({'accuracy': 0.5})
+    exp.finish()
+
+    # Database of a version without the partial index, with a duplicated metric
+    with sqlite3.connect(str(tmp_path / "old.sqlite")) as connection:
+        connection.execute("DROP INDEX result_name_value")
+        connection.execute("INSERT INTO result (name, value, theta) "
+                           "SELECT name, value, theta FROM result")
+        connection.execute("INSERT INTO result_experiment_through (result_id, experiment_id) "
+                           "SELECT MAX(id), 1 FROM result")
+    os.replace(str(tmp_path / "old.sqlite"), str(tmp_path / "migrated.sqlite"))
+
+    exp = make_experiment(database_name="migrated.sqlite")
+    exp.add_metrics({'accuracy': 0.5})
+    exp.finish()
+
+    with sqlite3.connect(str(tmp_path / "migrated.sqlite")) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM result").fetchone()[0] == 1
+        assert sorted(connection.execute(
+            "SELECT experiment_id FROM result_experiment_through")) == [(1,), (2,)]
+        assert "result_name_value" in {row[1] for row in connection.execute(
+            "PRAGMA index_list(result)")}
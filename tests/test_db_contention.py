@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+""" Multi-process contention benchmark of the experiments database.
+
+Multiple processes, every one with its own experiment, write metrics at the same time to the same
+database with the "wal" pragmas profile. All the writes must succeed, without "database is locked"
+errors, and the writers throughput must be above a minimum.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKERS = 8
+WRITES = 50  # Transactions by worker
+MIN_THROUGHPUT = 20  # Transactions by second, of all the workers
+
+_SCRIPT = """
+import json
+import logging
+import sys
+import time
+
+from mmn_experiments.experiment import experiment
+
+path, worker, writes = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+
+exp = experiment.Experiment(path, explanation=f"worker {worker}", database_name="db.sqlite",
+                            database_pragmas="wal", logger=logging.getLogger(__name__))
+exp.init()
+
+start = time.perf_counter()
+for step in range(writes):
+    exp.add_metrics({f"worker_{worker}": step})
+elapsed = time.perf_counter() - start
+
+exp.finish()
+print(json.dumps({'elapsed': elapsed}))
+"""
+
+
+def test_concurrent_writers(tmp_path):
+    processes = [subprocess.Popen([sys.executable, "-c", _SCRIPT, str(tmp_path), str(worker),
+                                   str(WRITES)], cwd=ROOT, stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, universal_newlines=True)
+                 for worker in range(WORKERS)]
+    outputs = [process.communicate() for process in processes]
+
+    for process, (_, error) in zip(processes, outputs):
+        assert process.returncode == 0, error
+
+    with sqlite3.connect(str(tmp_path / "db.sqlite")) as connection:
+        experiments = connection.execute("SELECT COUNT(*) FROM experiment").fetchone()[0]
+        results = connection.execute("SELECT COUNT(*) FROM result").fetchone()[0]
+
+    assert experiments == WORKERS
+    assert results == WORKERS * WRITES
+
+    # The writers run at the same time, the startup of the processes is not measured
+    elapsed = max(json.loads(output.strip().splitlines()[-1])['elapsed'] for output, _ in outputs)
+    throughput = WORKERS * WRITES / elapsed
+    print(f"{WORKERS} writers: {throughput:.1f} transactions/s")
+
+    assert throughput > MIN_THROUGHPUT
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+""" Benchmark of the metric and parameter writes of the experiments database.
+
+Measures the latency of add_metrics by the size of the dictionary of metrics. Every call is a single
+transaction, so the latency must grow much slower than the number of metrics.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import os
+import sqlite3
+import time
+
+SIZES = (1, 10, 50, 200)
+CALLS = 10
+
+
+def _count(exp, query: str) -> int:
+    with sqlite3.connect(os.path.join(os.path.dirname(exp.path), "db.sqlite")) as connection:
+        return connection.execute(query).fetchone()[0]
+
+
+def test_metrics_latency_by_size(make_experiment):
+    exp = make_experiment(database_name="db.sqlite")
+
+    latencies = {}
+    for size in SIZES:
+        start = time.perf_counter()
+        for call in range(CALLS):
+            exp.add_metrics({f"metric_{size}_{i}": call for i in range(size)})
+        latencies[size] = (time.perf_counter() - start) / CALLS
+    print(", ".join(f"{size} metrics: {latency * 1e3:.2f} ms" for size, latency in
+                    latencies.items()))
+
+    assert _count(exp, "SELECT COUNT(*) FROM result") == sum(SIZES) * CALLS
+    assert _count(exp, "SELECT COUNT(*) FROM result_experiment_through") == sum(SIZES) * CALLS
+    assert latencies[SIZES[-1]] < latencies[SIZES[0]] * SIZES[-1] / 4
+
+
+def test_repeated_values_are_linked_once(make_experiment):
+    exp = make_experiment(database_name="db.sqlite", params={"lr": 0.1, "epochs": 3})
+    for _ in range(3):
+        exp.add_metrics({"accuracy": 0.5, "loss": 1.0})
+    exp.finish()
+
+    other = make_experiment(database_name="db.sqlite", params={"lr": 0.1, "epochs": 4})
+    other.add_metrics({"accuracy": 0.5})
+    other.finish()
+
+    assert _count(exp, "SELECT COUNT(*) FROM result") == 2
+    assert _count(exp, "SELECT COUNT(*) FROM result_experiment_through") == 3
+    assert _count(exp, "SELECT COUNT(*) FROM param") == 3
+    assert _count(exp, "SELECT COUNT(*) FROM param_experiment_through") == 4
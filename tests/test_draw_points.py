@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+""" Tests and micro-benchmark of Experiment._draw_points.
+
+The vectorized implementation must draw the same image than the original loop, kept here as the
+reference. The only difference are the squares starting before the first row or column: the loop
+sliced them from a negative index, so they were not drawn, and now they are clipped to the image.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+from collections.abc import Iterable
+import time
+
+import numpy as np
+import pytest
+
+from mmn_experiments.experiment.experiment import Experiment
+
+POINT_COUNTS = (100, 1000, 10000)
+
+
+def _draw_points_loop(img, points, values, side=0):
+    mask = np.copy(img).astype(np.float32)
+
+    for i, point in enumerate(points):
+        value = values[i] if isinstance(values, Iterable) else values
+        if side == 0:
+            mask[point[1], point[0]] = value
+        else:
+            mask[int(point[1] - side): int(point[1] + side),
+                 int(point[0] - side): int(point[0] + side)] = value
+
+    return mask
+
+
+def _points(count: int, size: int, rng, side: float = 0, as_float: bool = False) -> np.ndarray:
+    """ Random points, the squares of the side can only exceed the last row or column. """
+    if as_float:
+        return rng.uniform(side, size - 1, size=(count, 2))
+
+    return rng.integers(int(np.ceil(side)), size, size=(count, 2))
+
+
+@pytest.mark.parametrize("side", [0, 1, 2, 5])
+@pytest.mark.parametrize("channels", [None, 3])
+def test_same_output_than_loop(side, channels):
+    rng = np.random.default_rng(side)
+    shape = (64, 48) if channels is None else (64, 48, channels)
+    image = rng.integers(0, 255, size=shape).astype(np.uint8)
+    points = _points(200, 48, rng, side)
+
+    for values in (7, rng.uniform(0, 1, size=len(points))):
+        expected = _draw_points_loop(image, points, values, side)
+        assert np.array_equal(Experiment._draw_points(image, points, values, side), expected)
+
+
+def test_float_points_and_colour_values():
+    rng = np.random.default_rng(0)
+    image = np.zeros((32, 32, 3), dtype=np.uint8)
+    colours = rng.integers(0, 255, size=(50, 3))
+
+    for side in (0.5, 1.5, 3):
+        points = _points(len(colours), 32, rng, side, as_float=True)
+        expected = _draw_points_loop(image, points, colours, side)
+        assert np.array_equal(Experiment._draw_points(image, points, colours, side), expected)
+
+
+def test_squares_clipped_to_the_image():
+    image = np.zeros((8, 8), dtype=np.uint8)
+    points = np.array([[0, 0], [7, 7]])
+
+    drawn = Experiment._draw_points(image, points, [1, 2], side=2)
+
+    expected = np.zeros((8, 8), dtype=np.float32)
+    expected[:2, :2] = 1
+    expected[5:, 5:] = 2
+    assert np.array_equal(drawn, expected)
+
+
+def test_faster_than_loop():
+    rng = np.random.default_rng(0)
+    image = np.zeros((512, 512), dtype=np.uint8)
+
+    timings = []
+    for count in POINT_COUNTS:
+        points = _points(count, 512, rng)
+        values = rng.uniform(0, 1, size=count)
+
+        start = time.perf_counter()
+        _draw_points_loop(image, points, values, side=2)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Experiment._draw_points(image, points, values, side=2)
+        vectorized_time = time.perf_counter() - start
+
+        timings.append((count, loop_time, vectorized_time))
+        print(f"{count} points: loop {loop_time * 1e3:.2f} ms, "
+              f"vectorized {vectorized_time * 1e3:.2f} ms")
+
+    _, loop_time, vectorized_time = timings[-1]
+    assert vectorized_time < loop_time
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+""" Benchmark of the image formats of the experiments.
+
+Measures the encode time and the size of every format of IMAGE_FORMATS, with its default options,
+for the colour and binary images. The lossless formats must be read back without changes.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from mmn_experiments.data import dades
+from mmn_experiments.experiment.experiment import IMAGE_FORMATS
+
+cv2 = pytest.importorskip("cv2")
+
+IMAGES = 8
+LOSSLESS = ("png", "webp", "npy")
+
+
+def _images(storage_type: dades.StorageType) -> list:
+    """ Smooth images with noise, closer to real images than uniform noise. """
+    rng = np.random.default_rng(0)
+    rows, cols = np.mgrid[0:256, 0:256]
+    images = []
+    for i in range(IMAGES):
+        base = (rows * (i + 1) + cols) % 256
+        if storage_type == dades.StorageType.BINARY_IMAGE:
+            images.append(np.where(base > 127, 255, 0).astype(np.uint8))
+        else:
+            noise = rng.integers(0, 8, size=(256, 256, 3))
+            images.append(np.clip(base[..., None] + noise, 0, 255).astype(np.uint8))
+
+    return images
+
+
+def _load(file_path: str) -> np.ndarray:
+    if file_path.endswith(".npy"):
+        return np.load(file_path)
+
+    return cv2.imread(file_path, cv2.IMREAD_UNCHANGED)
+
+
+@pytest.mark.parametrize("storage_type", [dades.StorageType.COLOR_IMAGE,
+                                          dades.StorageType.BINARY_IMAGE])
+@pytest.mark.parametrize("image_format", sorted(IMAGE_FORMATS))
+def test_encode_time_and_size(make_experiment, storage_type, image_format):
+    images = _images(storage_type)
+    exp = make_experiment(image_format=image_format)
+
+    start = time.perf_counter()
+    for image in images:
+        exp.save_result(dades.Data(image, "images", tipus=storage_type))
+    elapsed = time.perf_counter() - start
+
+    files = [os.path.join(exp.path, "images", f"{i}.{image_format}") for i in range(IMAGES)]
+    size = sum(os.path.getsize(file_path) for file_path in files)
+    print(f"{storage_type} {image_format}: {elapsed / IMAGES * 1e3:.2f} ms/image, "
+          f"{size / IMAGES / 1024:.1f} KiB/image")
+
+    for image, file_path in zip(images, files):
+        loaded = _load(file_path)
+        if image_format == "webp" and image.ndim == 2:  # WebP has no grey images
+            loaded = loaded[..., 0]
+        assert loaded.shape == image.shape
+        if image_format in LOSSLESS:
+            assert np.array_equal(loaded, image)
+
+
+def test_data_options_override_experiment(make_experiment):
+    image = _images(dades.StorageType.COLOR_IMAGE)[0]
+    exp = make_experiment(image_format="jpg", image_options={'JPEG_QUALITY': 90})
+
+    exp.save_result(dades.Data(image, "images", name="default"))
+    exp.save_result(dades.Data(image, "images", name="low", image_options={'JPEG_QUALITY': 10}))
+
+    folder = os.path.join(exp.path, "images")
+    assert os.path.getsize(os.path.join(folder, "low.jpg")) < \
+        os.path.getsize(os.path.join(folder, "default.jpg"))
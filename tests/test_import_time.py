@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+""" Import-time regression benchmark.
+
+The package is imported on a fresh interpreter, so the modules already loaded by pytest do not hide
+the cost of the import. The heavy backends (TensorFlow, cv2, matplotlib and telegram_send) must only
+be loaded when used.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET = 1.0  # Seconds
+RUNS = 3  # The fastest run is compared with the budget, to reduce the noise
+HEAVY_MODULES = ("cv2", "matplotlib", "tensorflow", "telegram_send")
+
+_SCRIPT = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import mmn_experiments
+elapsed = time.perf_counter() - start
+
+print(json.dumps({'elapsed': elapsed,
+                  'loaded': [name for name in %r if name in sys.modules]}))
+"""
+
+
+def _import_package() -> dict:
+    output = subprocess.run([sys.executable, "-c", _SCRIPT % (HEAVY_MODULES,)], cwd=ROOT,
+                            check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_heavy_modules():
+    assert _import_package()['loaded'] == []
+
+
+def test_import_time_under_budget():
+    elapsed = min(_import_package()['elapsed'] for _ in range(RUNS))
+
+    assert elapsed < IMPORT_BUDGET, f"import mmn_experiments took {elapsed:.3f} s"
+
+
+def test_keras_subpackage_is_lazy():
+    script = ("import sys, mmn_experiments; mmn_experiments.keras; "
+              "print(any(name in sys.modules for name in %r))" % (HEAVY_MODULES,))
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    assert output.strip() == "False"
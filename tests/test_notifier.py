@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+""" Tests of the background notifier and the telegram callback, with a stub transport.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import threading
+import time
+
+import pytest
+
+from mmn_experiments.keras import notifier
+
+
+class StubTransport:
+    """ Records the messages sent. While not released, every send waits. """
+
+    def __init__(self, released: bool = True):
+        self.messages = []
+        self.images = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+        if released:
+            self.release.set()
+
+    def __call__(self, messages, images=None):
+        self.started.set()
+        self.release.wait()
+        self.messages += messages
+        self.images.append(images)
+
+
+def _busy_notifier(policy: str):
+    """ Notifier with a queue of one message, full, and the transport waiting. """
+    transport = StubTransport(released=False)
+    notif = notifier.Notifier(transport, queue_size=1, policy=policy)
+
+    notif.send(["first"])
+    transport.started.wait(5)
+    notif.send(["second"])
+
+    return notif, transport
+
+
+def test_drop_when_full():
+    notif, transport = _busy_notifier("drop")
+
+    assert not notif.send(["third"])
+    assert notif.dropped == 1
+
+    transport.release.set()
+    notif.close()
+    assert transport.messages == ["first", "second"]
+
+
+def test_wait_when_full():
+    notif, transport = _busy_notifier("wait")
+    threading.Timer(0.1, transport.release.set).start()
+
+    assert notif.send(["third"])
+
+    notif.close()
+    assert transport.messages == ["first", "second", "third"]
+    assert notif.dropped == 0
+
+
+def test_wait_overrides_drop_policy():
+    notif, transport = _busy_notifier("drop")
+    threading.Timer(0.1, transport.release.set).start()
+
+    assert notif.send(["last"], wait=True, timeout=5)
+
+    notif.close()
+    assert transport.messages == ["first", "second", "last"]
+
+
+def test_wait_timeout_drops():
+    notif, transport = _busy_notifier("drop")
+
+    assert not notif.send(["last"], wait=True, timeout=0.05)
+    assert notif.dropped == 1
+
+    transport.release.set()
+    notif.close()
+
+
+def test_close_does_not_wait_a_hanging_transport():
+    notif, _ = _busy_notifier("drop")
+
+    start = time.monotonic()
+    notif.close(timeout=0.1)
+
+    assert time.monotonic() - start < 1
+
+
+def test_errors_of_the_transport_are_warned():
+    def failing(messages, images=None):
+        raise ConnectionError("offline")
+
+    notif = notifier.Notifier(failing)
+    notif.send(["message"])
+
+    with pytest.warns(UserWarning):
+        notif.close()
+
+
+def test_callback_coalesces_epochs_and_sends_the_end():
+    pytest.importorskip("tensorflow")
+    from mmn_experiments.keras.telegramCallback import TelegramCallback
+
+    transport = StubTransport(released=False)
+    callback = TelegramCallback(transport=transport, min_interval=3600, queue_size=1,
+                                close_timeout=5)
+
+    callback.on_train_begin()
+    transport.started.wait(5)
+    for epoch in range(5):
+        callback.on_epoch_begin(epoch)
+        callback.on_epoch_end(epoch, logs={'loss': float(epoch)})
+    threading.Timer(0.1, transport.release.set).start()
+    callback.on_train_end()
+
+    assert len(transport.messages) == 3
+    assert "epochs 0 to 4" in transport.messages[1]
+    assert transport.messages[2].startswith("Train finished")
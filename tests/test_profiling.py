@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+""" Tests of the profilers of the experiment decorator.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import tracemalloc
+
+import pytest
+
+from mmn_experiments import profiling
+
+
+def test_profiler_is_abstract():
+    with pytest.raises(TypeError):
+        profiling.Profiler()
+
+
+@pytest.mark.parametrize("mode", sorted(profiling.PROFILERS))
+def test_profilers_summary(tmp_path, mode):
+    profiler = profiling.create_profilers(mode, {'sampling': {'interval': 0.001},
+                                                 'resources': {'interval': 0.01}})[mode]
+
+    profiler.start()
+    sum(sum(range(1000)) for _ in range(100))
+    summary, metrics = profiler.stop(str(tmp_path))
+
+    assert isinstance(summary, dict) and isinstance(metrics, dict)
+
+
+def test_memory_profiler_keeps_the_tracing_of_the_caller(tmp_path):
+    tracemalloc.start()
+    try:
+        profiler = profiling.MemoryProfiler()
+        profiler.start()
+        _, metrics = profiler.stop(str(tmp_path))
+
+        assert tracemalloc.is_tracing()
+        assert metrics['memory_peak_mb'] >= 0
+    finally:
+        tracemalloc.stop()
+
+
+def test_memory_profiler_stops_its_tracing(tmp_path):
+    profiler = profiling.MemoryProfiler()
+    profiler.start()
+    profiler.stop(str(tmp_path))
+
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+""" Tests and benchmark of the serialization of the objects saved by the experiments.
+
+Written by: Miquel Miró Nicolau (UIB)
+"""
+import io
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+from mmn_experiments.data import dades
+from mmn_experiments.experiment import serialization
+
+ARRAYS = 8
+ARRAY_SIZE = 2 ** 20  # Elements of every array
+
+needs_out_of_band = pytest.mark.skipif(not serialization.OUT_OF_BAND,
+                                       reason="Out-of-band buffers need the pickle protocol 5")
+
+
+def _codecs() -> list:
+    return [None, "gzip"] + [pytest.param(codec, marks=pytest.mark.skipif(
+        not serialization._codec_installed(codec), reason=f"{codec} is not installed"))
+        for codec in ("zstd", "lz4")]
+
+
+def _state() -> dict:
+    rng = np.random.default_rng(0)
+    return {'weights': [rng.standard_normal(ARRAY_SIZE).astype(np.float32)
+                        for _ in range(ARRAYS)],
+            'epoch': 3, 'name': "model"}
+
+
+def _assert_same(loaded: dict, state: dict) -> None:
+    assert loaded['epoch'] == state['epoch'] and loaded['name'] == state['name']
+    for loaded_array, array in zip(loaded['weights'], state['weights']):
+        assert np.array_equal(loaded_array, array)
+
+
+@pytest.mark.parametrize("codec", _codecs())
+def test_round_trip(codec):
+    state = _state()
+    handle = io.BytesIO()
+
+    serialization.dump(state, handle, compression=codec)
+    handle.seek(0)
+
+    _assert_same(serialization.load(handle), state)
+
+
+@needs_out_of_band
+@pytest.mark.parametrize("codec", _codecs())
+def test_buffers_memory_mapped(tmp_path, codec):
+    state = _state()
+    path = str(tmp_path / "state.pickle")
+
+    buffers = []
+    with open(path, "wb") as handle:
+        serialization.dump(state, handle, compression=codec, buffers=buffers)
+    with open(path + serialization.BUFFERS_SUFFIX, "wb") as handle:
+        serialization.write_buffers(handle, buffers)
+
+    loaded = serialization.load_path(path)
+
+    _assert_same(loaded, state)
+    assert len(buffers) == ARRAYS
+    assert os.path.getsize(path) < ARRAY_SIZE  # The arrays are only on the sidecar file
+    assert not loaded['weights'][0].flags.writeable
+
+
+def test_buffers_need_protocol_5(monkeypatch):
+    monkeypatch.setattr(serialization, "OUT_OF_BAND", False)
+
+    with pytest.raises(ValueError):
+        serialization.dump(_state(), io.BytesIO(), buffers=[])
+
+
+@pytest.mark.parametrize("options", [
+    {}, {'pickle_compression': "auto"},
+    pytest.param({'pickle_buffers': True}, marks=needs_out_of_band),
+    pytest.param({'pickle_compression': "auto", 'pickle_buffers': True}, marks=needs_out_of_band)])
+def test_experiment_objects(make_experiment, options):
+    state = _state()
+    exp = make_experiment(**options)
+
+    start = time.perf_counter()
+    exp.save_result(dades.Data(state, "objects", name="state", tipus=dades.StorageType.OBJECT))
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = exp.reader().get("objects", "state")
+    load_time = time.perf_counter() - start
+
+    with open(os.path.join(exp.path, "objects", "state.pickle"), "rb") as handle:
+        size = len(handle.read())
+    print(f"{options}: save {save_time * 1e3:.1f} ms, load {load_time * 1e3:.1f} ms, "
+          f"pickle {size / 2 ** 20:.1f} MiB")
+
+    _assert_same(loaded, state)
+
+
+def test_plain_pickle_baseline():
+    state = _state()
+
+    start = time.perf_counter()
+    content = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    loaded = pickle.loads(content)
+    print(f"pickle.dumps and loads: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    _assert_same(loaded, state)